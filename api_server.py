@@ -1,25 +1,241 @@
 """
 Minimal REST API server for external tools
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
+import chess
+import orjson
 import json
 import logging
-from typing import Dict, List, Optional
+import threading
+import queue
+import uuid
+import re
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
 
+from config import config
 from data_manager import DataManager
-from utils import normalize_fen, get_logger, fetch_lichess_api
+from engine_analyzer import engine_manager
+from utils import normalize_fen, get_logger, fetch_lichess_api, ttl_cache, TTLCache, fast_epd
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes responses with orjson"""
+    
+    option = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=self.option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand the encoded bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.option),
+                                        mimetype="application/json")
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for all routes
 
+# Compress larger responses; ETags are weak so they stay valid across encodings
+app.config["COMPRESS_ALGORITHM"] = ["zstd", "br", "gzip"]
+app.config["COMPRESS_LEVEL"] = 3
+app.config["COMPRESS_MIN_SIZE"] = 512
+app.config["COMPRESS_STREAMS"] = False  # Keep streamed exports streaming
+Compress(app)
+
 # Initialize data manager
 data_manager = DataManager()
 logger = get_logger()
 
+# Database calls run on a small fixed pool rather than the per-request server
+# threads, so each worker's SQLite connection is opened once and reused
+_db_executor = ThreadPoolExecutor(max_workers=config.cache.db_workers, thread_name_prefix="db")
+
+def _on_db(fn, *args):
+    """Run a data_manager call on the database pool and wait for its result"""
+    return _db_executor.submit(fn, *args).result()
+
+# Cheap shape check for FEN path segments, run before any parsing
+_FEN_RE = re.compile(r'^[1-8pnbrqkPNBRQK/]{15,71} [wb] (-|[KQkq]{1,4}) (-|[a-h][36])( \d+ \d+)?$')
+
+def _valid_fen(fen: str) -> bool:
+    """Check that a string looks like a FEN"""
+    return _FEN_RE.match(fen) is not None
+
+def etag_cache(max_age: int = 60):
+    """Tag successful responses with a weak ETag and Cache-Control header.
+    
+    Clients that send a matching If-None-Match get an empty 304 instead.
+    An ETag the view already set is kept; streamed responses without one
+    are passed through untouched.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            
+            if response.get_etag()[0] is None:
+                if response.is_streamed:
+                    return response
+                etag = hashlib.blake2b(response.get_data(), digest_size=8).hexdigest()
+                response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = f"public, max-age={max_age}"
+            # A fresh stream's tag can't match yet, and checking would buffer the body
+            if response.is_streamed:
+                return response
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+@ttl_cache(maxsize=config.cache.response_cache_size, ttl=config.cache.response_cache_ttl_seconds)
+def _cached_stats(normalized_fen: str, network: Optional[str]) -> List[Dict]:
+    """Get JSON-serializable statistics for a position, memoized per (FEN, network)"""
+    stats = _on_db(data_manager.get_position_stats, normalized_fen, network)
+    return [stat.to_dict() for stat in stats]
+
+# (ETag, encoded JSON export) pairs, per (FEN, network)
+_export_cache = TTLCache(maxsize=config.cache.response_cache_size, ttl=config.cache.response_cache_ttl_seconds)
+
+def _export_etag(normalized_fen: str, network: Optional[str]) -> str:
+    """Tag a new export from its cache key and a fresh version, before the body exists"""
+    version = uuid.uuid4().bytes
+    return hashlib.blake2b(orjson.dumps([normalized_fen, network]) + version, digest_size=8).hexdigest()
+
+def _encode_export_rows(normalized_fen: str, network: Optional[str], rows: queue.SimpleQueue):
+    """Encode export rows on a database thread, ending with None or the error raised"""
+    try:
+        for index, stat in enumerate(data_manager.iter_position_stats(normalized_fen, network)):
+            rows.put((b',' if index else b'') + orjson.dumps(stat.to_dict()))
+    except Exception as e:
+        rows.put(e)
+    else:
+        rows.put(None)
+
+def _stream_export(normalized_fen: str, network: Optional[str], etag: str) -> Iterator[bytes]:
+    """Stream the JSON export one move at a time, caching the body with its ETag once complete"""
+    chunks = [b'{"fen":' + orjson.dumps(normalized_fen) + b',"stats":[']
+    yield chunks[0]
+    
+    # The queue is unbounded so a slow client never holds a database thread
+    rows = queue.SimpleQueue()
+    _db_executor.submit(_encode_export_rows, normalized_fen, network, rows)
+    while (chunk := rows.get()) is not None:
+        if isinstance(chunk, Exception):
+            raise chunk
+        chunks.append(chunk)
+        yield chunk
+    
+    chunks.append(b']}')
+    yield chunks[-1]
+    _export_cache.set((normalized_fen, network), (etag, b''.join(chunks)))
+
+# Engine analyses run on a worker pool; results are polled by task id
+_analysis_executor = ThreadPoolExecutor(max_workers=config.engine.engine_threads,
+                                        thread_name_prefix="analysis")
+_analysis_tasks = TTLCache(maxsize=1024, ttl=config.engine.analysis_result_ttl_seconds)
+
+def _run_analysis(fen: str, engine_name: str, time_limit: Optional[int],
+                  depth_limit: Optional[int]) -> Dict:
+    """Analyze a position with an engine and return the JSON result"""
+    moves = engine_manager.analyze_position(
+        fen, engine_name, time_limit, depth_limit
+    )
+    
+    # Convert to JSON format
+    result = []
+    for move in moves:
+        result.append({
+            "move": move.move,
+            "score": move.score,
+            "depth": move.depth,
+            "time_ms": move.time_ms,
+            "pv": move.pv
+        })
+    
+    return {
+        "fen": fen,
+        "engine": engine_name,
+        "status": "complete",
+        "moves": result,
+        "total_moves": len(result)
+    }
+
+# Lichess lookups run in the background so requests never wait on the external API
+_lichess_cache = TTLCache(maxsize=config.cache.response_cache_size, ttl=config.cache.lichess_cache_ttl_seconds)
+_lichess_executor = ThreadPoolExecutor(max_workers=config.network.lichess_max_workers,
+                                       thread_name_prefix="lichess")
+_lichess_pending = set()
+_lichess_lock = threading.Lock()
+
+def _refresh_lichess(normalized_fen: str):
+    """Fetch Lichess explorer data for a position into the cache"""
+    try:
+        data = fetch_lichess_api(normalized_fen, endpoint="lichess")
+        _lichess_cache.set(normalized_fen, data)
+        logger.info("Fetched Lichess stats for FEN %s", normalized_fen)
+    except Exception as e:
+        logger.error("Failed to fetch Lichess stats for FEN %s: %s", normalized_fen, e)
+    finally:
+        with _lichess_lock:
+            _lichess_pending.discard(normalized_fen)
+
+def _schedule_lichess_refresh(normalized_fen: str):
+    """Queue a background Lichess fetch unless one is already in flight"""
+    with _lichess_lock:
+        if normalized_fen in _lichess_pending:
+            return
+        _lichess_pending.add(normalized_fen)
+    _lichess_executor.submit(_refresh_lichess, normalized_fen)
+
+def _cached_lichess(normalized_fen: str) -> Optional[Dict]:
+    """Get cached Lichess data for a position, or None while it is being fetched"""
+    data = _lichess_cache.get(normalized_fen)
+    if data is None:
+        _schedule_lichess_refresh(normalized_fen)
+    return data
+
+# The health check body never changes, so encode it once
+_HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "data_manager": "available",
+    "cache_size": "unknown"  # Could implement cache size checking
+})
+
+@ttl_cache(maxsize=1, ttl=30)
+def _engine_list_body() -> bytes:
+    """Get the encoded engine list; probing every engine is slow, so refresh every 30 s"""
+    engines = engine_manager.get_available_engines()
+    
+    engine_info = []
+    for engine in engines:
+        info = engine_manager.get_engine_info(engine)
+        engine_info.append({
+            "name": engine,
+            "status": info.get("status", "unknown")
+        })
+    
+    return orjson.dumps({
+        "engines": engine_info,
+        "total": len(engines)
+    })
+
 @app.route('/api/stats/<fen>', methods=['GET'])
+@etag_cache()
 def get_position_stats(fen: str):
     """Get statistics for a position"""
+    if not _valid_fen(fen):
+        return jsonify({"error": "invalid FEN"}), 400
+    
     try:
         # Get query parameters
         network = request.args.get('network')
@@ -29,32 +245,10 @@ def get_position_stats(fen: str):
         normalized_fen = normalize_fen(fen)
         
         # Get statistics
-        stats = data_manager.get_position_stats(normalized_fen, network)
+        result = _cached_stats(normalized_fen, network)
         
-        # Convert to JSON-serializable format
-        result = []
-        for stat in stats:
-            result.append({
-                "move": stat.move,
-                "performance_score": stat.performance_score,
-                "decisiveness_score": stat.decisiveness_score,
-                "wins": stat.wins,
-                "losses": stat.losses,
-                "draws": stat.draws,
-                "total_games": stat.total_games,
-                "confidence_level": stat.confidence_level,
-                "network": stat.network,
-                "source_files": stat.source_files,
-                "last_updated": stat.last_updated
-            })
-        # Fetch Lichess stats for this FEN
-        logger = get_logger()
-        lichess_data = None
-        try:
-            lichess_data = fetch_lichess_api(normalized_fen, endpoint="lichess")
-            logger.info(f"Fetched Lichess stats for FEN {normalized_fen}: {lichess_data}")
-        except Exception as e:
-            logger.error(f"Failed to fetch Lichess stats for FEN {normalized_fen}: {e}")
+        # Lichess stats for this FEN (null until the background fetch completes)
+        lichess_data = _cached_lichess(normalized_fen)
         return jsonify({
             "fen": normalized_fen,
             "side": side,
@@ -63,34 +257,72 @@ def get_position_stats(fen: str):
             "lichess": lichess_data
         })
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/position/<fen>', methods=['GET'])
+@etag_cache()
 def get_position_info(fen: str):
     """Get general information about a position"""
+    if not _valid_fen(fen):
+        return jsonify({"error": "invalid FEN"}), 400
+    
     try:
         normalized_fen = normalize_fen(fen)
         
         # Get legal moves
-        from utils import get_legal_moves
-        legal_moves = get_legal_moves(normalized_fen)
+        board = chess.Board(normalized_fen)
+        legal_moves = [move.uci() for move in board.legal_moves]
         
         # Get basic stats
-        stats = data_manager.get_position_stats(normalized_fen)
-        total_games = sum(stat.total_games for stat in stats)
+        moves_with_data, total_games = _on_db(data_manager.get_aggregate, normalized_fen)
         
         return jsonify({
             "fen": normalized_fen,
             "legal_moves": legal_moves,
             "total_moves": len(legal_moves),
-            "moves_with_data": len(stats),
+            "moves_with_data": moves_with_data,
             "total_games": total_games,
-            "has_data": len(stats) > 0
+            "has_data": moves_with_data > 0
         })
         
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/prefetch/<fen>', methods=['POST'])
+def prefetch_position(fen: str):
+    """Warm the Lichess cache for the likely next positions"""
+    if not _valid_fen(fen):
+        return jsonify({"error": "invalid FEN"}), 400
+    
+    try:
+        network = request.args.get('network')
+        normalized_fen = normalize_fen(fen)
+        board = chess.Board(normalized_fen)
+        
+        # Prefer the best-scoring moves we have data for, then any legal move
+        moves = [stat["move"] for stat in _cached_stats(normalized_fen, network)]
+        if not moves:
+            moves = [move.uci() for move in board.legal_moves]
+        
+        # Misses are fetched concurrently on the background Lichess pool
+        queued = []
+        for move in moves[:config.ui.prefetch_moves]:
+            board.push_uci(move)
+            child_fen = normalize_fen(board.fen())
+            board.pop()
+            if _cached_lichess(child_fen) is None:
+                queued.append(child_fen)
+        
+        return jsonify({
+            "fen": normalized_fen,
+            "queued": queued,
+            "total_queued": len(queued)
+        }), 202
+        
+    except Exception as e:
+        logger.error("Prefetch API error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/search', methods=['POST'])
@@ -116,136 +348,125 @@ def search_positions():
         })
         
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "data_manager": "available",
-        "cache_size": "unknown"  # Could implement cache size checking
-    })
+    return Response(_HEALTH_BODY, mimetype='application/json')
 
 @app.route('/api/cache/clear', methods=['POST'])
 def clear_cache():
     """Clear the cache"""
     try:
-        data_manager.cleanup_cache()
+        _on_db(data_manager.cleanup_cache)
+        _cached_stats.cache_clear()
+        _export_cache.clear()
+        _lichess_cache.clear()
         return jsonify({"message": "Cache cleared successfully"})
     except Exception as e:
-        logger.error(f"Cache clear error: {e}")
+        logger.error("Cache clear error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/engines', methods=['GET'])
+@etag_cache()
 def get_available_engines():
     """Get list of available engines"""
     try:
-        from engine_analyzer import engine_manager
-        engines = engine_manager.get_available_engines()
-        
-        engine_info = []
-        for engine in engines:
-            info = engine_manager.get_engine_info(engine)
-            engine_info.append({
-                "name": engine,
-                "status": info.get("status", "unknown")
-            })
-        
-        return jsonify({
-            "engines": engine_info,
-            "total": len(engines)
-        })
+        return Response(_engine_list_body(), mimetype='application/json')
         
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/analyze/<fen>', methods=['POST'])
 def analyze_position(fen: str):
     """Analyze a position with engine"""
+    if not _valid_fen(fen):
+        return jsonify({"error": "invalid FEN"}), 400
+    
     try:
         data = request.get_json() or {}
         engine_name = data.get('engine', 'stockfish')
         time_limit = data.get('time_limit', 5000)  # 5 seconds default
         depth_limit = data.get('depth_limit')
         
-        from engine_analyzer import engine_manager
-        
         # Check if engine is available
         if engine_name not in engine_manager.get_available_engines():
             return jsonify({"error": f"Engine {engine_name} not available"}), 400
         
-        # Perform analysis
-        moves = engine_manager.analyze_position(
-            fen, engine_name, time_limit, depth_limit
-        )
-        
-        # Convert to JSON format
-        result = []
-        for move in moves:
-            result.append({
-                "move": move.move,
-                "score": move.score,
-                "depth": move.depth,
-                "time_ms": move.time_ms,
-                "pv": move.pv
-            })
+        # Run the analysis on the worker pool so this request thread is freed immediately
+        task_id = uuid.uuid4().hex
+        future = _analysis_executor.submit(_run_analysis, fen, engine_name, time_limit, depth_limit)
+        _analysis_tasks.set(task_id, future)
         
         return jsonify({
-            "fen": fen,
-            "engine": engine_name,
-            "moves": result,
-            "total_moves": len(result)
-        })
+            "task_id": task_id,
+            "status": "pending"
+        }), 202
         
     except Exception as e:
-        logger.error(f"Analysis API error: {e}")
+        logger.error("Analysis API error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analyze/result/<task_id>', methods=['GET'])
+def get_analysis_result(task_id: str):
+    """Get the result of a queued engine analysis"""
+    try:
+        future = _analysis_tasks.get(task_id)
+        if future is None:
+            return jsonify({"error": f"Unknown analysis task: {task_id}"}), 404
+        
+        if not future.done():
+            return jsonify({"task_id": task_id, "status": "pending"}), 202
+        
+        error = future.exception()
+        if error is not None:
+            logger.error("Analysis task %s failed: %s", task_id, error)
+            return jsonify({"task_id": task_id, "status": "failed", "error": str(error)}), 500
+        
+        return jsonify(future.result())
+        
+    except Exception as e:
+        logger.error("Analysis API error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/export/<fen>', methods=['GET'])
+@etag_cache()
 def export_position(fen: str):
     """Export position data in various formats"""
+    if not _valid_fen(fen):
+        return jsonify({"error": "invalid FEN"}), 400
+    
     try:
         format_type = request.args.get('format', 'json')
         network = request.args.get('network')
         
         normalized_fen = normalize_fen(fen)
-        stats = data_manager.get_position_stats(normalized_fen, network)
         
         if format_type == 'json':
-            result = {
-                "fen": normalized_fen,
-                "stats": []
-            }
-            
-            for stat in stats:
-                result["stats"].append({
-                    "move": stat.move,
-                    "performance_score": stat.performance_score,
-                    "decisiveness_score": stat.decisiveness_score,
-                    "wins": stat.wins,
-                    "losses": stat.losses,
-                    "draws": stat.draws,
-                    "total_games": stat.total_games,
-                    "confidence_level": stat.confidence_level,
-                    "network": stat.network
-                })
-            
-            return jsonify(result)
+            cached = _export_cache.get((normalized_fen, network))
+            if cached is None:
+                # The streamed response and the cached body it leaves behind share one tag
+                etag = _export_etag(normalized_fen, network)
+                body = _stream_export(normalized_fen, network, etag)
+            else:
+                etag, body = cached
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            return response
             
         elif format_type == 'pgn':
-            import chess
             board = chess.Board(normalized_fen)
-            pgn = board.epd()
+            pgn = fast_epd(board)
             return pgn, 200, {'Content-Type': 'text/plain'}
             
         else:
             return jsonify({"error": f"Unsupported format: {format_type}"}), 400
             
     except Exception as e:
-        logger.error(f"Export API error: {e}")
+        logger.error("Export API error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.errorhandler(404)
@@ -260,8 +481,13 @@ def internal_error(error):
 
 def run_api_server(host: str = 'localhost', port: int = 5000, debug: bool = False):
     """Run the API server"""
-    logger.info(f"Starting API server on {host}:{port}")
-    app.run(host=host, port=port, debug=debug)
+    logger.info("Starting API server on %s:%s", host, port)
+    # One thread per request so slow engine/IO handlers don't block the rest
+    try:
+        app.run(host=host, port=port, debug=debug, threaded=True)
+    finally:
+        _db_executor.shutdown(wait=True)
+        data_manager.close()
 
 if __name__ == '__main__':
     run_api_server() 
\ No newline at end of file
@@ -2,11 +2,13 @@
 Configuration settings for the Chess Opening Explorer
 """
 import os
+import functools
 from pathlib import Path
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CacheConfig:
     """Cache configuration settings"""
     max_size_gb: float = 0.05  # Reduced to 50MB for better compatibility
@@ -14,8 +16,12 @@ class CacheConfig:
     cache_dir: Path = Path("cache")
     lmdb_path: Path = Path("cache/data.lmdb")
     sqlite_path: Path = Path("cache/stats.db")
+    response_cache_size: int = 10_000  # Entries in the API in-process caches
+    response_cache_ttl_seconds: int = 300
+    lichess_cache_ttl_seconds: int = 3600
+    db_workers: int = 4  # API threads that keep long-lived SQLite connections
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class NetworkConfig:
     """Network and download settings"""
     timeout_seconds: int = 30
@@ -23,33 +29,34 @@ class NetworkConfig:
     bandwidth_limit_mbps: float = 10.0
     chunk_size: int = 8192
     resume_downloads: bool = True
+    lichess_max_workers: int = 4  # Concurrent background Lichess lookups
+    max_parallel_downloads: int = 4  # Concurrent dataset downloads
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class EngineConfig:
     """Engine analysis settings"""
     default_engine: str = "stockfish"
     engine_time_ms: int = 1000
     engine_depth: int = 20
     engine_threads: int = 4
+    analysis_result_ttl_seconds: int = 600  # How long API analysis results are kept
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UIConfig:
     """User interface settings"""
     board_size: int = 400
     theme: str = "default"
     auto_prefetch: bool = True
     prefetch_moves: int = 3
-    confidence_thresholds: Dict[str, int] = None
+    confidence_thresholds: Mapping[str, int] = field(
+        default_factory=lambda: MappingProxyType({
+            "low": 10,
+            "medium": 50,
+            "high": 100
+        })
+    )
 
-    def __post_init__(self):
-        if self.confidence_thresholds is None:
-            self.confidence_thresholds = {
-                "low": 10,
-                "medium": 50,
-                "high": 100
-            }
-
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DataConfig:
     """Data source and processing settings"""
     lczero_base_url: str = "https://lczero.org/play/networks/"
@@ -59,6 +66,11 @@ class DataConfig:
     normalize_fen: bool = True
     deduplicate_transpositions: bool = True
 
+@functools.lru_cache(maxsize=1024)
+def _join(base: str, filename: str) -> Path:
+    """Join a directory and a filename, memoized since the same paths recur"""
+    return Path(base + os.sep + filename)
+
 class Config:
     """Main configuration class"""
     
@@ -69,16 +81,19 @@ class Config:
         self.ui = UIConfig()
         self.data = DataConfig()
         
-        # Ensure cache directory exists
+        # Ensure cache directories exist
         self.cache.cache_dir.mkdir(exist_ok=True)
+        self._cache_dir = str(self.cache.cache_dir)
+        self._archive_dir = str(self.cache.cache_dir / "archives")
+        Path(self._archive_dir).mkdir(parents=True, exist_ok=True)
         
     def get_cache_path(self, filename: str) -> Path:
         """Get path for cache file"""
-        return self.cache.cache_dir / filename
+        return _join(self._cache_dir, filename)
     
     def get_archive_path(self, filename: str) -> Path:
         """Get path for archive file"""
-        return self.cache.cache_dir / "archives" / filename
+        return _join(self._archive_dir, filename)
 
 # Global configuration instance
 config = Config() 
\ No newline at end of file
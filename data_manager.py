@@ -3,6 +3,8 @@ Enhanced data management system for chess opening explorer
 Automatically downloads and manages chess datasets for position analysis
 """
 import lmdb
+import msgpack
+import numpy as np
 import sqlite3
 import json
 import time
@@ -12,25 +14,40 @@ import chess
 import chess.pgn
 import zstandard as zstd
 import gzip
+import io
 import bz2
 import lzma
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterator
 from dataclasses import dataclass
-from collections import defaultdict
+from collections import defaultdict, deque
 import logging
 import hashlib
 import os
-import shutil
 from urllib.parse import urlparse
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 from config import config
-from utils import normalize_fen, get_logger
+from utils import normalize_fen, get_logger, fast_epd, TTLCache
 
 logger = get_logger(__name__)
 
-@dataclass
+# Shared generator for sample statistics
+_rng = np.random.default_rng()
+
+# Baseline (wins, losses, draws) for sample statistics by moving piece
+_BASE_STATS_BY_PIECE = {
+    chess.PAWN: (45, 35, 20),    # Pawn moves are generally safer
+    chess.KNIGHT: (40, 40, 20),  # Minor pieces
+    chess.BISHOP: (40, 40, 20),
+    chess.ROOK: (42, 38, 20),
+    chess.QUEEN: (38, 42, 20),   # Queen moves (more risky)
+    chess.KING: (35, 45, 20),    # King moves (very risky)
+}
+
+@dataclass(slots=True, frozen=True)
 class GameResult:
     """Represents a game result from dataset"""
     fen: str
@@ -40,7 +57,7 @@ class GameResult:
     source_file: str
     timestamp: float
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MoveStats:
     """Represents move statistics"""
     fen: str
@@ -55,7 +72,7 @@ class MoveStats:
     
     def __post_init__(self):
         if self.last_updated is None:
-            self.last_updated = time.time()
+            object.__setattr__(self, "last_updated", time.time())
     
     @property
     def total_games(self) -> int:
@@ -83,6 +100,22 @@ class MoveStats:
             return "low"
         else:
             return "very_low"
+    
+    def to_dict(self) -> Dict:
+        """Convert to a JSON-serializable dict"""
+        return {
+            "move": self.move,
+            "performance_score": self.performance_score,
+            "decisiveness_score": self.decisiveness_score,
+            "wins": self.wins,
+            "losses": self.losses,
+            "draws": self.draws,
+            "total_games": self.total_games,
+            "confidence_level": self.confidence_level,
+            "network": self.network,
+            "source_files": self.source_files,
+            "last_updated": self.last_updated
+        }
 
 class DatasetManager:
     """Manages automatic dataset downloading and discovery with enhanced reliability"""
@@ -93,8 +126,15 @@ class DatasetManager:
         self.download_queue = []
         self.downloading = False
         self.lock = threading.Lock()
-        self._download_cache = {}  # Cache for download status
-        self._retry_count = {}  # Track retry attempts per dataset
+        self._download_cache = {}  # path -> (mtime_ns, size, integrity verdict)
+        self._retry_count = defaultdict(int)  # Track retry attempts per dataset
+        self._verified_sizes: Dict[str, int] = {}  # Size of each dataset when it last passed verification
+        
+        # Shared keep-alive session so retries and fallback URLs reuse connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         
         # Enhanced dataset sources with position-specific relevance
         self.dataset_sources = {
@@ -152,30 +192,23 @@ class DatasetManager:
             "endgame": ["lichess_2023_01", "lichess_2022_12", "lichess_2022_11", "lichess_2022_10"]
         }
         
-        # Initialize retry counts
-        for dataset_name in self.dataset_sources:
-            self._retry_count[dataset_name] = 0
-    
-    def _calculate_checksum(self, filepath: Path) -> str:
-        """Calculate SHA256 checksum of a file"""
-        try:
-            hash_sha256 = hashlib.sha256()
-            with open(filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
-        except Exception as e:
-            logger.error(f"Failed to calculate checksum for {filepath}: {e}")
-            return None
+        # Datasets by ply: opening below 10, middlegame below 30, endgame from there on
+        self._ply_to_datasets = (
+            [self.position_datasets["opening"]] * 10
+            + [self.position_datasets["middlegame"]] * 20
+            + [self.position_datasets["endgame"]]
+        )
     
     def _verify_file_integrity(self, filepath: Path, expected_size_mb: int = None) -> bool:
         """Verify file integrity by checking size and basic structure"""
         try:
-            if not filepath.exists():
+            try:
+                st = filepath.stat()
+            except FileNotFoundError:
                 return False
             
             # Check file size
-            actual_size_mb = filepath.stat().st_size / (1024 * 1024)
+            actual_size_mb = st.st_size / (1024 * 1024)
             if expected_size_mb and actual_size_mb < expected_size_mb * 0.9:  # Allow 10% tolerance
                 logger.warning(f"File {filepath.name} is smaller than expected: {actual_size_mb:.1f}MB vs {expected_size_mb}MB")
                 return False
@@ -185,42 +218,23 @@ class DatasetManager:
                 logger.warning(f"File {filepath.name} is too small: {actual_size_mb:.1f}MB")
                 return False
             
-            # Try to read the first few bytes to check if it's a valid compressed file
-            try:
-                with open(filepath, 'rb') as f:
-                    header = f.read(8)  # Read more bytes for better detection
-                    
-                    # Check for zstd magic number (0x28B52FFD)
-                    if filepath.suffix == '.zst':
-                        # Zstd files can have different header formats, be more lenient
-                        if len(header) >= 4:
-                            # Check for zstd magic number or frame header
-                            if (header.startswith(b'\x28\xb5\x2f\xfd') or 
-                                header.startswith(b'\x28\xb5\x2f\xfd') or
-                                any(b in header for b in [b'\x28\xb5', b'\x2f\xfd'])):
-                                return True
-                            else:
-                                # If it's a large file, it might still be valid zstd
-                                if actual_size_mb > 100:  # Large files are likely valid
-                                    logger.debug(f"Large file {filepath.name} ({actual_size_mb:.1f}MB) - assuming valid zstd")
-                                    return True
-                                else:
-                                    logger.warning(f"File {filepath.name} doesn't appear to be a valid zstd file")
-                                    return False
-                        else:
-                            logger.warning(f"File {filepath.name} is too small to verify header")
-                            return False
-                    else:
-                        # For other file types, just check if file is readable
-                        return True
-                        
-            except Exception as e:
-                logger.warning(f"Failed to read file header for {filepath.name}: {e}")
-                # If we can't read the header but the file is large, assume it's valid
-                if actual_size_mb > 100:
-                    logger.debug(f"Large file {filepath.name} ({actual_size_mb:.1f}MB) - assuming valid despite header read error")
+            # Decode the start of zstd streams (including in-progress .tmp downloads);
+            # libzstd rejects bad magic numbers and corrupt blocks
+            if filepath.name.endswith(('.zst', '.zst.tmp')):
+                try:
+                    with open(filepath, 'rb') as f:
+                        with zstd.ZstdDecompressor().stream_reader(f) as reader:
+                            reader.read(1 << 20)
                     return True
-                return False
+                except zstd.ZstdError as e:
+                    logger.warning(f"File {filepath.name} is not a valid zstd stream: {e}")
+                    return False
+                except OSError as e:
+                    logger.warning(f"Failed to read {filepath.name}: {e}")
+                    return False
+            
+            # For other file types, just check if file is readable
+            return True
             
         except Exception as e:
             logger.error(f"Error verifying file integrity for {filepath}: {e}")
@@ -257,14 +271,31 @@ class DatasetManager:
                     'Connection': 'keep-alive'
                 }
                 
-                response = requests.get(url, stream=True, timeout=60, headers=headers)
+                # Resume a partial download left by an earlier attempt
+                resume_pos = 0
+                if config.network.resume_downloads and temp_filepath.exists():
+                    resume_pos = temp_filepath.stat().st_size
+                if resume_pos:
+                    headers['Range'] = f'bytes={resume_pos}-'
+                    print(f"[INFO] Resuming from byte {resume_pos:,}", flush=True)
+                
+                response = self.session.get(url, stream=True, timeout=60, headers=headers)
+                if response.status_code == 416:
+                    # Partial file doesn't fit the remote one; start over
+                    response.close()
+                    headers.pop('Range')
+                    resume_pos = 0
+                    response = self.session.get(url, stream=True, timeout=60, headers=headers)
                 response.raise_for_status()
                 
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded_size = 0
+                if resume_pos and response.status_code != 206:
+                    print(f"[INFO] Server ignored the range request; restarting download", flush=True)
+                    resume_pos = 0
+                
+                total_size = resume_pos + int(response.headers.get('content-length', 0))
+                downloaded_size = resume_pos
                 start_time = time.time()
                 last_report_time = start_time
-                last_reported_mb = 0
                 chunk_count = 0
                 
                 print(f"[INFO] Response status: {response.status_code}", flush=True)
@@ -274,49 +305,62 @@ class DatasetManager:
                 print(f"[INFO] Starting download...", flush=True)
                 print(f"{'-'*80}", flush=True)
                 
-                with open(temp_filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            chunk_count += 1
-                            now = time.time()
-                            mb_downloaded = downloaded_size / (1024 * 1024)
-                            elapsed = now - start_time
-                            speed = mb_downloaded / elapsed if elapsed > 0 else 0
-                            percent = (downloaded_size / total_size * 100) if total_size > 0 else 0
-                            
-                            # Calculate ETA
-                            if speed > 0 and total_size > 0:
-                                remaining_mb = (total_size - downloaded_size) / (1024 * 1024)
-                                eta_seconds = remaining_mb / speed
-                                eta_str = f"{math.ceil(eta_seconds)}s"
-                            else:
-                                eta_str = "calculating..."
-                            
-                            # Print progress every 5MB or every 2 seconds or on completion
-                            if (mb_downloaded - last_reported_mb >= 5) or (now - last_report_time >= 2) or downloaded_size == total_size:
-                                # Create progress bar
-                                bar_length = 40
-                                filled_length = int(bar_length * downloaded_size // total_size) if total_size > 0 else 0
-                                bar = '█' * filled_length + '░' * (bar_length - filled_length)
-                                
-                                progress_str = (
-                                    f"[PROGRESS] {mb_downloaded:.1f}MB / {total_size / (1024*1024):.1f}MB "
-                                    f"({percent:.1f}%) | Speed: {speed:.2f} MB/s | ETA: {eta_str} | "
-                                    f"Chunks: {chunk_count:,} | Elapsed: {elapsed:.1f}s"
-                                )
-                                
-                                print(f"\r{progress_str}", end='', flush=True)
-                                print(f"\n[{bar}] {percent:.1f}%", flush=True)
-                                
-                                logger.info(progress_str)
-                                last_report_time = now
-                                last_reported_mb = mb_downloaded
+                # Hash while writing so the finished file never has to be re-read
+                hash_sha256 = hashlib.sha256()
+                if resume_pos:
+                    with open(temp_filepath, 'rb') as f:
+                        for chunk in iter(lambda: f.read(1 << 20), b""):
+                            hash_sha256.update(chunk)
+                
+                with open(temp_filepath, 'ab' if resume_pos else 'wb') as f:
+                    # 1MB chunks keep the copy loop in C for most of each read
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        if not chunk:
+                            continue
+                        hash_sha256.update(chunk)
+                        f.write(chunk)
+                        downloaded_size += len(chunk)
+                        chunk_count += 1
+                        
+                        # Report at most once per second, plus once on completion
+                        now = time.time()
+                        if now - last_report_time < 1.0 and downloaded_size != total_size:
+                            continue
+                        
+                        mb_downloaded = downloaded_size / (1024 * 1024)
+                        elapsed = now - start_time
+                        speed = (downloaded_size - resume_pos) / (1024 * 1024) / elapsed if elapsed > 0 else 0
+                        percent = (downloaded_size / total_size * 100) if total_size > 0 else 0
+                        
+                        # Calculate ETA
+                        if speed > 0 and total_size > 0:
+                            remaining_mb = (total_size - downloaded_size) / (1024 * 1024)
+                            eta_seconds = remaining_mb / speed
+                            eta_str = f"{math.ceil(eta_seconds)}s"
+                        else:
+                            eta_str = "calculating..."
+                        
+                        # Create progress bar
+                        bar_length = 40
+                        filled_length = int(bar_length * downloaded_size // total_size) if total_size > 0 else 0
+                        bar = '█' * filled_length + '░' * (bar_length - filled_length)
+                        
+                        progress_str = (
+                            f"[PROGRESS] {mb_downloaded:.1f}MB / {total_size / (1024*1024):.1f}MB "
+                            f"({percent:.1f}%) | Speed: {speed:.2f} MB/s | ETA: {eta_str} | "
+                            f"Chunks: {chunk_count:,} | Elapsed: {elapsed:.1f}s"
+                        )
+                        
+                        # One write and one flush per report
+                        sys.stdout.write(f"\r{progress_str}\n[{bar}] {percent:.1f}%\n")
+                        sys.stdout.flush()
+                        
+                        logger.debug(progress_str)
+                        last_report_time = now
                 
                 total_time = time.time() - start_time
                 final_mb = downloaded_size / (1024 * 1024)
-                avg_speed = final_mb / total_time if total_time > 0 else 0
+                avg_speed = (downloaded_size - resume_pos) / (1024 * 1024) / total_time if total_time > 0 else 0
                 
                 print(f"\n{'-'*80}", flush=True)
                 print(f"[DOWNLOAD COMPLETE] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
@@ -329,18 +373,21 @@ class DatasetManager:
                 logger.info("Verifying file integrity...")
                 
                 if self._verify_file_integrity(temp_filepath):
-                    # Move temp file to final location
-                    if filepath.exists():
-                        print(f"[INFO] Removing existing file: {filepath}", flush=True)
-                        filepath.unlink()  # Remove existing file
-                    
+                    # Atomic rename over any existing file; the temp file sits
+                    # next to the target so this never falls back to a copy
                     print(f"[INFO] Moving temporary file to final location...", flush=True)
-                    shutil.move(temp_filepath, filepath)
+                    os.replace(temp_filepath, filepath)
+                    
+                    st = filepath.stat()
+                    final_size = st.st_size
+                    digest = hash_sha256.hexdigest()
+                    source = self.dataset_sources.get(filepath.name.removesuffix('.pgn.zst'))
+                    if source is not None:
+                        source["checksum"] = digest
                     
-                    final_size = filepath.stat().st_size
                     print(f"[SUCCESS] Successfully downloaded and verified {filepath.name}", flush=True)
                     print(f"[FINAL SIZE] {final_size:,} bytes ({final_size / (1024*1024):.2f} MB)", flush=True)
-                    print(f"[CHECKSUM] {self._calculate_checksum(filepath)[:16]}...", flush=True)
+                    print(f"[CHECKSUM] {digest[:16]}...", flush=True)
                     print(f"{'='*80}", flush=True)
                     
                     logger.info(f"Successfully downloaded and verified {filepath.name}")
@@ -353,9 +400,8 @@ class DatasetManager:
                         print(f"[INFO] Removing corrupted temporary file: {temp_filepath}", flush=True)
                         temp_filepath.unlink()
                     
-                    print(f"[ABORT] Aborting due to failed integrity check.", flush=True)
-                    logger.error("Aborting due to failed integrity check.")
-                    sys.exit(1)
+                    # Let the caller fall back to the next mirror
+                    return False
                     
             except requests.exceptions.RequestException as e:
                 print(f"\n[WARNING] Download attempt {attempt + 1} failed for {url}", flush=True)
@@ -374,10 +420,11 @@ class DatasetManager:
             except KeyboardInterrupt:
                 print(f"\n[INTERRUPT] Download interrupted by user", flush=True)
                 logger.warning("Download interrupted by user")
-                if temp_filepath.exists():
+                # Keep the partial file when the next run can resume it
+                if not config.network.resume_downloads and temp_filepath.exists():
                     print(f"[INFO] Cleaning up temporary file: {temp_filepath}", flush=True)
                     temp_filepath.unlink()
-                sys.exit(1)
+                raise
                 
             except Exception as e:
                 print(f"\n[FATAL] Unexpected error during download: {e}", flush=True)
@@ -391,19 +438,16 @@ class DatasetManager:
     def get_relevant_datasets_for_position(self, fen: str) -> List[str]:
         """Get relevant datasets for a specific position"""
         try:
-            board = chess.Board(fen)
-            move_count = len(board.move_stack)
-            
-            # Determine position type based on move count
-            if move_count < 10:
-                position_type = "opening"
-            elif move_count < 30:
-                position_type = "middlegame"
-            else:
-                position_type = "endgame"
+            # A board built from a FEN has no move history, so take the ply
+            # from the fullmove number and side to move instead
+            try:
+                parts = fen.split()
+                ply = (int(parts[5]) - 1) * 2 + (0 if parts[1] == 'w' else 1)
+            except (ValueError, IndexError):
+                ply = 0
             
-            # Get relevant datasets for this position type
-            relevant_datasets = self.position_datasets.get(position_type, [])
+            # Get relevant datasets for this stage of the game
+            relevant_datasets = self._ply_to_datasets[min(max(ply, 0), len(self._ply_to_datasets) - 1)]
             
             # Filter to only available datasets
             available_datasets = []
@@ -429,16 +473,42 @@ class DatasetManager:
         filename = f"{dataset_name}.pgn.zst"
         filepath = self.dataset_dir / filename
         
-        if not filepath.exists():
+        try:
+            st = filepath.stat()
+        except FileNotFoundError:
             return False
         
+        # Reuse the last verdict while the file is unchanged
+        cached = self._cached_verdict(filepath, st)
+        if cached is not None:
+            return cached
+        
         # Verify file integrity
         source = self.dataset_sources[dataset_name]
-        if not self._verify_file_integrity(filepath, source.get("size_mb")):
+        verified = self._verify_file_integrity(filepath, source.get("size_mb"))
+        if not verified:
             logger.warning(f"Dataset {dataset_name} exists but failed integrity check")
-            return False
         
-        return True
+        self._store_verdict(filepath, st, verified)
+        return verified
+    
+    @staticmethod
+    def _verdict_stamp(st: os.stat_result) -> Tuple[int, int]:
+        """File attributes a cached verdict is only valid for"""
+        return st.st_mtime_ns, st.st_size
+    
+    def _cached_verdict(self, filepath: Path, st: os.stat_result) -> Optional[bool]:
+        """Last integrity verdict for a file, or None if it changed or was never checked"""
+        with self.lock:
+            entry = self._download_cache.get(filepath)
+        if entry is None or entry[:2] != self._verdict_stamp(st):
+            return None
+        return entry[2]
+    
+    def _store_verdict(self, filepath: Path, st: os.stat_result, verified: bool):
+        """Remember a verdict, replacing any made for an older version of the file"""
+        with self.lock:
+            self._download_cache[filepath] = (*self._verdict_stamp(st), verified)
     
     def download_dataset(self, dataset_name: str) -> bool:
         """Download a chess dataset with extremely detailed status updates and enhanced error handling"""
@@ -508,7 +578,8 @@ class DatasetManager:
                         logger.error(f"All URLs failed for dataset {dataset_name}")
             
             # If we get here, all URLs failed
-            self._retry_count[dataset_name] += 1
+            with self.lock:
+                self._retry_count[dataset_name] += 1
             print(f"[ERROR] Failed to download dataset {dataset_name} after trying all URLs", flush=True)
             logger.error(f"Failed to download dataset {dataset_name} after trying all URLs")
             return False
@@ -516,36 +587,65 @@ class DatasetManager:
         except Exception as e:
             print(f"[FATAL] Unexpected error downloading dataset {dataset_name}: {e}", flush=True)
             logger.error(f"Unexpected error downloading dataset {dataset_name}: {e}")
-            self._retry_count[dataset_name] += 1
+            with self.lock:
+                self._retry_count[dataset_name] += 1
             return False
     
     def download_relevant_datasets_for_position(self, fen: str) -> List[str]:
         """Download datasets relevant to a specific position with enhanced reliability"""
         relevant_datasets = self.get_relevant_datasets_for_position(fen)
-        downloaded_datasets = []
+        available = {dataset for dataset in relevant_datasets if self.is_dataset_available(dataset)}
+        missing = [dataset for dataset in relevant_datasets if dataset not in available]
         
-        for dataset in relevant_datasets:
-            if not self.is_dataset_available(dataset):
+        # Download missing datasets in parallel; the transfers are network-bound
+        if missing:
+            for dataset in missing:
                 logger.info(f"Downloading relevant dataset for position: {dataset}")
-                if self.download_dataset(dataset):
-                    downloaded_datasets.append(dataset)
+            
+            # Each download goes through download_dataset, so retries, fallback URLs,
+            # verification and the pooled session all still apply
+            workers = min(len(missing), config.network.max_parallel_downloads)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self.download_dataset, missing))
+            
+            for dataset, success in zip(missing, results):
+                if success:
+                    available.add(dataset)
                 else:
                     logger.warning(f"Failed to download dataset {dataset} for position {fen}")
-            else:
-                downloaded_datasets.append(dataset)
+        
+        downloaded_datasets = [dataset for dataset in relevant_datasets if dataset in available]
         
         return downloaded_datasets
     
+    def _scan_dataset_dir(self) -> Dict[str, os.DirEntry]:
+        """List the dataset directory once; DirEntry objects cache their stat data"""
+        try:
+            with os.scandir(self.dataset_dir) as it:
+                return {entry.name: entry for entry in it}
+        except FileNotFoundError:
+            return {}
+    
     def cleanup_corrupted_datasets(self):
         """Clean up corrupted or incomplete dataset files"""
         try:
+            entries = self._scan_dataset_dir()
             for dataset_name in self.dataset_sources:
-                filename = f"{dataset_name}.pgn.zst"
-                filepath = self.dataset_dir / filename
+                entry = entries.get(f"{dataset_name}.pgn.zst")
+                if entry is None:
+                    continue
                 
-                if filepath.exists() and not self._verify_file_integrity(filepath):
+                # Only re-verify files whose size changed since they last passed
+                size = entry.stat(follow_symlinks=False).st_size
+                if self._verified_sizes.get(dataset_name) == size:
+                    continue
+                
+                if self._verify_file_integrity(Path(entry.path)):
+                    self._verified_sizes[dataset_name] = size
+                else:
                     logger.warning(f"Removing corrupted dataset: {dataset_name}")
-                    filepath.unlink()
+                    self._verified_sizes.pop(dataset_name, None)
+                    os.unlink(entry.path)
                     
         except Exception as e:
             logger.error(f"Error cleaning up corrupted datasets: {e}")
@@ -555,33 +655,81 @@ class DatasetManager:
         if dataset_name not in self.dataset_sources:
             return {"error": "Unknown dataset"}
         
-        source = self.dataset_sources[dataset_name]
         filename = f"{dataset_name}.pgn.zst"
         filepath = self.dataset_dir / filename
         
+        try:
+            st = filepath.stat()
+        except FileNotFoundError:
+            st = None
+        
+        verified = st is not None and self.is_dataset_available(dataset_name)
+        return self._build_status(dataset_name, st, verified)
+    
+    def _build_status(self, dataset_name: str, st: Optional[os.stat_result], verified: bool) -> Dict:
+        """Status dict for a dataset from an already-taken stat of its file"""
+        source = self.dataset_sources[dataset_name]
         status = {
             "name": dataset_name,
             "description": source["description"],
             "size_mb": source["size_mb"],
-            "downloaded": filepath.exists(),
-            "verified": self.is_dataset_available(dataset_name),
-            "retry_count": self._retry_count.get(dataset_name, 0),
+            "downloaded": st is not None,
+            "verified": verified,
+            "retry_count": self._retry_count[dataset_name],
             "checksum": source.get("checksum")
         }
         
-        if filepath.exists():
-            status["file_size_mb"] = filepath.stat().st_size / (1024 * 1024)
-            status["last_modified"] = time.ctime(filepath.stat().st_mtime)
+        if st is not None:
+            status["file_size_mb"] = st.st_size / (1024 * 1024)
+            status["last_modified"] = time.ctime(st.st_mtime)
         
         return status
+    
+    def get_all_statuses(self, verify: bool = True) -> Dict[str, Tuple[Dict, Optional[bool]]]:
+        """Status and availability of every dataset from a single directory scan.
+        
+        Files whose integrity verdict isn't cached are verified unless verify is
+        False, in which case their availability is reported as None.
+        """
+        entries = self._scan_dataset_dir()
+        statuses = {}
+        for dataset_name in self.dataset_sources:
+            entry = entries.get(f"{dataset_name}.pgn.zst")
+            st = entry.stat() if entry is not None else None
+            
+            if st is None:
+                available = False
+            else:
+                available = self._cached_verdict(self.dataset_dir / entry.name, st)
+                if available is None and verify:
+                    available = self.is_dataset_available(dataset_name)
+            
+            statuses[dataset_name] = (self._build_status(dataset_name, st, bool(available)), available)
+        return statuses
 
 class ArchiveIndex:
     """Index for finding relevant archives for positions"""
     
-    def __init__(self):
+    def __init__(self, lmdb_env=None, batch_size: int = 10_000):
         self.index_file = Path("cache/archive_index.json")
         self.index = {}
-        self.load_index()
+        self.lmdb_env = lmdb_env
+        self.db = None
+        self.batch_size = batch_size
+        self._pending = defaultdict(list)  # Entries buffered until the next flush
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        
+        if self.lmdb_env is not None:
+            try:
+                self.db = self.lmdb_env.open_db(b'archive_idx')
+                logger.info("Using LMDB archive index")
+            except Exception as e:
+                logger.error(f"Error opening LMDB archive index, falling back to JSON: {e}")
+                self.db = None
+        
+        if self.db is None:
+            self.load_index()
     
     def load_index(self):
         """Load archive index from file"""
@@ -598,46 +746,258 @@ class ArchiveIndex:
             self.index = {}
     
     def save_index(self):
-        """Save archive index to file"""
+        """Save archive index to LMDB or file"""
+        if self.db is not None:
+            self.flush()
+            return
+        
         try:
             with open(self.index_file, 'w') as f:
-                json.dump(self.index, f, indent=2)
+                json.dump(self.index, f, separators=(',', ':'))
             logger.info("Saved archive index")
         except Exception as e:
             logger.error(f"Error saving archive index: {e}")
     
+    def flush(self):
+        """Write buffered index entries to LMDB in a single transaction"""
+        if self.db is None:
+            return
+        
+        with self._lock:
+            pending = self._pending
+            self._pending = defaultdict(list)
+            self._pending_count = 0
+        
+        if not pending:
+            return
+        
+        try:
+            with self.lmdb_env.begin(write=True, db=self.db) as txn:
+                for fen, entries in pending.items():
+                    key = fen.encode()
+                    existing = txn.get(key)
+                    if existing is not None:
+                        entries = msgpack.unpackb(existing) + entries
+                    txn.put(key, msgpack.packb(entries))
+            logger.debug(f"Flushed {len(pending)} positions to archive index")
+        except Exception as e:
+            logger.error(f"Error flushing archive index: {e}")
+    
     def add_fen_data(self, fen: str, network: str, archive_file: str, game_count: int):
         """Add FEN data to index"""
         normalized_fen = normalize_fen(fen)
-        if normalized_fen not in self.index:
-            self.index[normalized_fen] = []
-        
-        self.index[normalized_fen].append({
+        entry = {
             "network": network,
             "file": archive_file,
             "game_count": game_count
-        })
+        }
+        
+        if self.db is None:
+            self.index.setdefault(normalized_fen, []).append(entry)
+            return
+        
+        with self._lock:
+            self._pending[normalized_fen].append(entry)
+            self._pending_count += 1
+            should_flush = self._pending_count >= self.batch_size
+        
+        if should_flush:
+            self.flush()
+    
+    def add_fen_data_batch(self, updates: List[Tuple[str, str, str]]):
+        """Add one game's worth of (fen, network, archive_file) entries at once"""
+        if self.db is None:
+            for fen, network, archive_file in updates:
+                self.index.setdefault(fen, []).append(
+                    {"network": network, "file": archive_file, "game_count": 1})
+            return
+        
+        with self._lock:
+            for fen, network, archive_file in updates:
+                self._pending[fen].append(
+                    {"network": network, "file": archive_file, "game_count": 1})
+            self._pending_count += len(updates)
+            should_flush = self._pending_count >= self.batch_size
+        
+        if should_flush:
+            self.flush()
     
     def find_archives_for_fen(self, fen: str, network: str = None) -> List[Dict]:
         """Find archives containing data for a FEN position"""
         normalized_fen = normalize_fen(fen)
-        if normalized_fen not in self.index:
-            return []
         
-        archives = self.index[normalized_fen]
+        if self.db is None:
+            archives = self.index.get(normalized_fen, [])
+        else:
+            archives = []
+            try:
+                with self.lmdb_env.begin(db=self.db) as txn:
+                    data = txn.get(normalized_fen.encode())
+                if data is not None:
+                    archives = msgpack.unpackb(data)
+            except Exception as e:
+                logger.error(f"Error reading archive index: {e}")
+            with self._lock:
+                archives = archives + self._pending.get(normalized_fen, [])
+        
         if network:
             archives = [a for a in archives if a["network"] == network]
         
         return archives
 
+# Move statistics with their source files, from the join table and from the
+# legacy JSON column for rows written before it
+_MOVE_STATS_SELECT = """
+    SELECT m.fen, m.move, m.wins, m.losses, m.draws, m.network,
+           (SELECT GROUP_CONCAT(s.source_file) FROM move_source_files s
+            WHERE s.fen = m.fen AND s.move = m.move AND s.network IS m.network) AS joined_source_files,
+           m.source_files AS legacy_source_files, m.last_updated, m.evaluation_score
+    FROM move_stats m
+"""
+
+_SQL_GET_MOVE_STATS_NET = _MOVE_STATS_SELECT + """
+    WHERE m.fen = ? AND m.move = ? AND m.network = ?
+"""
+_SQL_GET_MOVE_STATS = _MOVE_STATS_SELECT + """
+    WHERE m.fen = ? AND m.move = ?
+"""
+_SQL_ALL_MOVES_NET = _MOVE_STATS_SELECT + """
+    WHERE m.fen = ? AND m.network = ?
+    ORDER BY m.win_rate_x1000 DESC
+"""
+_SQL_ALL_MOVES = _MOVE_STATS_SELECT + """
+    WHERE m.fen = ?
+    ORDER BY m.win_rate_x1000 DESC
+"""
+_SQL_POSITION_TOTALS_NET = """
+    SELECT COUNT(*), COALESCE(SUM(wins + losses + draws), 0)
+    FROM move_stats 
+    WHERE fen = ? AND network = ?
+"""
+_SQL_POSITION_TOTALS = """
+    SELECT COUNT(*), COALESCE(SUM(wins + losses + draws), 0)
+    FROM move_stats 
+    WHERE fen = ?
+"""
+_SQL_UPSERT = """
+    INSERT OR REPLACE INTO move_stats 
+    (fen, move, wins, losses, draws, network, source_files, last_updated, evaluation_score)
+    VALUES (?, ?, ?, ?, ?, ?, NULL, ?, ?)
+"""
+_SQL_ACCUMULATE = """
+    INSERT INTO move_stats (fen, move, wins, losses, draws, network, last_updated)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (fen, move, network) DO UPDATE SET
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        draws = draws + excluded.draws,
+        last_updated = excluded.last_updated
+"""
+_SQL_INSERT_SOURCE_FILE = """
+    INSERT OR IGNORE INTO move_source_files (fen, move, network, source_file)
+    VALUES (?, ?, ?, ?)
+"""
+
+def _decode_source_files(joined: Optional[str], legacy: Optional[str]) -> List[str]:
+    """Source files from the join table, falling back to the legacy JSON column"""
+    if joined:
+        return joined.split(',')
+    return json.loads(legacy) if legacy else []
+
+def _row_to_move_stats(row) -> MoveStats:
+    """Build MoveStats from a _MOVE_STATS_SELECT row"""
+    fen, move, wins, losses, draws, network, joined, legacy, last_updated, evaluation_score = row
+    return MoveStats(
+        fen=fen,
+        move=move,
+        wins=wins,
+        losses=losses,
+        draws=draws,
+        network=network,
+        source_files=_decode_source_files(joined, legacy),
+        last_updated=last_updated,
+        evaluation_score=evaluation_score
+    )
+
+# Game results are stored in LMDB as msgpack tuples with the result as a small int
+_RESULTS = ("1-0", "0-1", "1/2-1/2")
+_RESULT_CODES = {result: code for code, result in enumerate(_RESULTS)}
+
+def _pack_game_result(game_result: GameResult) -> Tuple[bytes, bytes]:
+    """Encode a game result as an LMDB (key, value) pair"""
+    key = f"{game_result.fen}:{game_result.move}:{game_result.network}".encode()
+    value = msgpack.packb((
+        game_result.fen, game_result.move,
+        _RESULT_CODES.get(game_result.result, game_result.result),
+        game_result.network, game_result.source_file, game_result.timestamp
+    ), use_bin_type=True)
+    return key, value
+
+# Bump alongside a new CacheManager._migrate_vN step
+_SCHEMA_VERSION = 2
+
 class CacheManager:
     """Manages LMDB and SQLite storage"""
     
     def __init__(self):
         self.lmdb_env = None
-        self.sqlite_conn = None
+        self._local = threading.local()  # One SQLite connection per thread
+        self._sqlite_ready = False
+        self._connections = []  # Every thread's connection, so close() can reach them
+        self._connections_lock = threading.Lock()
         self.init_storage()
     
+    @property
+    def sqlite_conn(self) -> Optional[sqlite3.Connection]:
+        """SQLite connection for the calling thread, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None and self._sqlite_ready:
+            conn = self._connect_sqlite()
+        return conn
+    
+    def _cursor(self) -> sqlite3.Cursor:
+        """Long-lived cursor for the calling thread's connection"""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self.sqlite_conn.cursor()
+            self._local.cursor = cursor
+        return cursor
+    
+    def _connect_sqlite(self) -> sqlite3.Connection:
+        """Open a SQLite connection for the calling thread in WAL mode"""
+        conn = sqlite3.connect(str(config.cache.sqlite_path), check_same_thread=False)
+        # WAL lets readers on other threads proceed while a write is in progress.
+        # The journal mode is stored in the database file, so it only needs
+        # setting once; the rest are per-connection.
+        if not self._sqlite_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-20000;
+            PRAGMA busy_timeout=5000;
+            PRAGMA mmap_size=268435456;
+        """)
+        conn.row_factory = sqlite3.Row
+        self._local.conn = conn
+        self._local.cursor = None
+        self._sqlite_ready = True
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close the SQLite connections opened by every thread"""
+        self._sqlite_ready = False
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"Error closing SQLite connection: {e}")
+        self._local = threading.local()
+    
     def init_storage(self):
         """Initialize LMDB and SQLite storage"""
         try:
@@ -646,30 +1006,28 @@ class CacheManager:
             if map_size < 1024 * 1024:  # Ensure minimum 1MB
                 map_size = 1024 * 1024
             
+            # The LMDB cache is rebuildable from the archives, so trade durability
+            # for write throughput: writemap avoids a copy per put and the sync
+            # flags defer fsync to the OS. A crash may lose the most recent
+            # commits; call sync() after a bulk load to make them durable.
             self.lmdb_env = lmdb.open(
                 str(config.cache.lmdb_path),
                 map_size=map_size,
                 subdir=False,
                 readonly=False,
+                writemap=True,
+                map_async=True,
+                metasync=False,
+                sync=False,
+                lock=True,
                 max_dbs=10  # Limit number of databases
             )
             logger.info("Initialized LMDB cache")
             
             # Initialize SQLite
-            self.sqlite_conn = sqlite3.connect(str(config.cache.sqlite_path), check_same_thread=False)
+            self._connect_sqlite()
             self.create_tables()
-            # --- MIGRATION: Ensure evaluation_score column exists ---
-            try:
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute("PRAGMA table_info(move_stats);")
-                columns = [row[1] for row in cursor.fetchall()]
-                if 'evaluation_score' not in columns:
-                    cursor.execute('ALTER TABLE move_stats ADD COLUMN evaluation_score INTEGER DEFAULT 0;')
-                    self.sqlite_conn.commit()
-                    logger.info("Migrated move_stats: added evaluation_score column.")
-            except Exception as mig_e:
-                logger.error(f"Migration error for move_stats: {mig_e}")
-            # --- END MIGRATION ---
+            self.migrate()
             logger.info("Initialized SQLite statistics database")
             
         except Exception as e:
@@ -677,20 +1035,9 @@ class CacheManager:
             # Fallback to SQLite only if LMDB fails
             try:
                 self.lmdb_env = None
-                self.sqlite_conn = sqlite3.connect(str(config.cache.sqlite_path), check_same_thread=False)
+                self._connect_sqlite()
                 self.create_tables()
-                # --- MIGRATION: Ensure evaluation_score column exists ---
-                try:
-                    cursor = self.sqlite_conn.cursor()
-                    cursor.execute("PRAGMA table_info(move_stats);")
-                    columns = [row[1] for row in cursor.fetchall()]
-                    if 'evaluation_score' not in columns:
-                        cursor.execute('ALTER TABLE move_stats ADD COLUMN evaluation_score INTEGER DEFAULT 0;')
-                        self.sqlite_conn.commit()
-                        logger.info("Migrated move_stats: added evaluation_score column.")
-                except Exception as mig_e:
-                    logger.error(f"Migration error for move_stats: {mig_e}")
-                # --- END MIGRATION ---
+                self.migrate()
                 logger.info("Initialized SQLite-only storage (LMDB failed)")
             except Exception as e2:
                 logger.error(f"Failed to initialize SQLite storage: {e2}")
@@ -711,10 +1058,24 @@ class CacheManager:
                 source_files TEXT,
                 last_updated REAL,
                 evaluation_score INTEGER DEFAULT 0,
+                win_rate_x1000 INTEGER GENERATED ALWAYS AS (
+                    (wins * 1000 + draws * 500) / MAX(wins + losses + draws, 1)
+                ) STORED,
                 PRIMARY KEY (fen, move, network)
             )
         """)
         
+        # One row per (move, source file); replaces the legacy JSON source_files column
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS move_source_files (
+                fen TEXT NOT NULL,
+                move TEXT NOT NULL,
+                network TEXT,
+                source_file TEXT NOT NULL,
+                PRIMARY KEY (fen, move, network, source_file)
+            )
+        """)
+        
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS dataset_metadata (
                 dataset_name TEXT PRIMARY KEY,
@@ -726,42 +1087,117 @@ class CacheManager:
         
         self.sqlite_conn.commit()
     
+    def migrate(self):
+        """Bring an existing database up to _SCHEMA_VERSION, once per schema change"""
+        conn = self.sqlite_conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            return
+        
+        try:
+            if version < 1:
+                self._migrate_v1(conn)
+            if version < 2:
+                self._migrate_v2(conn)
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Migration error for move_stats: {e}")
+    
+    @staticmethod
+    def _migrate_v1(conn: sqlite3.Connection):
+        """Add the evaluation_score column"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(move_stats)")]
+        if 'evaluation_score' not in columns:
+            conn.execute("ALTER TABLE move_stats ADD COLUMN evaluation_score INTEGER DEFAULT 0")
+            logger.info("Migrated move_stats: added evaluation_score column.")
+    
+    @staticmethod
+    def _migrate_v2(conn: sqlite3.Connection):
+        """Add the win-rate column and the position lookup indexes"""
+        # ALTER TABLE can only add generated columns as VIRTUAL
+        columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(move_stats)")]
+        if 'win_rate_x1000' not in columns:
+            conn.execute("""
+                ALTER TABLE move_stats ADD COLUMN win_rate_x1000 INTEGER GENERATED ALWAYS AS (
+                    (wins * 1000 + draws * 500) / MAX(wins + losses + draws, 1)
+                ) VIRTUAL
+            """)
+            logger.info("Migrated move_stats: added win_rate_x1000 column.")
+        
+        # The primary key already serves fen-only lookups; (fen, network) skips
+        # move in the middle of the key, so it needs its own index, which also
+        # returns rows already ordered by win rate
+        conn.execute("DROP INDEX IF EXISTS idx_move_stats_fen_network")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_move_stats_rate
+            ON move_stats(fen, network, win_rate_x1000 DESC)
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_move_stats_updated ON move_stats(last_updated)")
+    
+    def begin_batch(self):
+        """Group the following writes on this thread into one SQLite transaction"""
+        conn = self.sqlite_conn
+        if not conn or getattr(self._local, "in_batch", False):
+            return
+        # Only start a transaction if we aren't already inside one
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        self._local.in_batch = True
+    
+    def end_batch(self):
+        """Commit the transaction opened by begin_batch"""
+        conn = self.sqlite_conn
+        if not conn or not getattr(self._local, "in_batch", False):
+            return
+        self._local.in_batch = False
+        conn.commit()
+    
+    def _commit(self):
+        """Commit unless the calling thread is inside a batch"""
+        if not getattr(self._local, "in_batch", False):
+            self.sqlite_conn.commit()
+    
+    def sync(self):
+        """Flush LMDB writes to disk"""
+        if not self.lmdb_env:
+            return
+        try:
+            self.lmdb_env.sync(True)
+        except Exception as e:
+            logger.error(f"Error syncing LMDB: {e}")
+    
+    @staticmethod
+    def _game_result_stats(game_result: GameResult) -> MoveStats:
+        """Create a simple stats entry for a single game result"""
+        return MoveStats(
+            fen=game_result.fen,
+            move=game_result.move,
+            wins=1 if game_result.result == "1-0" else 0,
+            losses=1 if game_result.result == "0-1" else 0,
+            draws=1 if game_result.result == "1/2-1/2" else 0,
+            network=game_result.network,
+            source_files=[game_result.source_file],
+            last_updated=game_result.timestamp,
+            evaluation_score=0
+        )
+    
     def store_game_result(self, game_result: GameResult):
         """Store a game result in LMDB"""
         if not self.lmdb_env:
             # If LMDB is not available, store directly in SQLite
             try:
-                # Create a simple stats entry for this game result
-                stats = MoveStats(
-                    fen=game_result.fen,
-                    move=game_result.move,
-                    wins=1 if game_result.result == "1-0" else 0,
-                    losses=1 if game_result.result == "0-1" else 0,
-                    draws=1 if game_result.result == "1/2-1/2" else 0,
-                    network=game_result.network,
-                    source_files=[game_result.source_file],
-                    last_updated=game_result.timestamp,
-                    evaluation_score=0
-                )
-                self.update_move_stats(stats)
+                self.update_move_stats(self._game_result_stats(game_result))
                 return
             except Exception as e:
                 logger.error(f"Error storing game result in SQLite: {e}")
                 return
         
         try:
-            key = f"{game_result.fen}:{game_result.move}:{game_result.network}"
-            value = json.dumps({
-                "fen": game_result.fen,
-                "move": game_result.move,
-                "result": game_result.result,
-                "network": game_result.network,
-                "source_file": game_result.source_file,
-                "timestamp": game_result.timestamp
-            })
-            
+            key, value = _pack_game_result(game_result)
             with self.lmdb_env.begin(write=True) as txn:
-                txn.put(key.encode(), value.encode())
+                txn.put(key, value)
                 
         except Exception as e:
             logger.error(f"Error storing game result: {e}")
@@ -772,39 +1208,15 @@ class CacheManager:
             return None
         
         try:
-            cursor = self.sqlite_conn.cursor()
+            cursor = self._cursor()
             
             if network:
-                cursor.execute("""
-                    SELECT fen, move, wins, losses, draws, network, source_files, 
-                           last_updated, evaluation_score
-                    FROM move_stats 
-                    WHERE fen = ? AND move = ? AND network = ?
-                """, (fen, move, network))
+                cursor.execute(_SQL_GET_MOVE_STATS_NET, (fen, move, network))
             else:
-                cursor.execute("""
-                    SELECT fen, move, wins, losses, draws, network, source_files, 
-                           last_updated, evaluation_score
-                    FROM move_stats 
-                    WHERE fen = ? AND move = ?
-                """, (fen, move))
+                cursor.execute(_SQL_GET_MOVE_STATS, (fen, move))
             
             row = cursor.fetchone()
-            if row:
-                source_files = json.loads(row[6]) if row[6] else []
-                return MoveStats(
-                    fen=row[0],
-                    move=row[1],
-                    wins=row[2],
-                    losses=row[3],
-                    draws=row[4],
-                    network=row[5],
-                    source_files=source_files,
-                    last_updated=row[7],
-                    evaluation_score=row[8]
-                )
-            
-            return None
+            return _row_to_move_stats(row) if row else None
             
         except Exception as e:
             logger.error(f"Error getting move stats: {e}")
@@ -816,66 +1228,109 @@ class CacheManager:
             return
         
         try:
-            cursor = self.sqlite_conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO move_stats 
-                (fen, move, wins, losses, draws, network, source_files, last_updated, evaluation_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            self.update_move_stats_many([stats])
+            
+        except Exception as e:
+            logger.error(f"Error updating move stats: {e}")
+    
+    def update_move_stats_many(self, stats_list: List[MoveStats]):
+        """Write many move statistics rows with a single executemany"""
+        if not self.sqlite_conn or not stats_list:
+            return
+        
+        try:
+            cursor = self._cursor()
+            cursor.executemany(_SQL_UPSERT, [(
                 stats.fen, stats.move, stats.wins, stats.losses, stats.draws,
-                stats.network, json.dumps(stats.source_files), stats.last_updated,
-                stats.evaluation_score
-            ))
-            self.sqlite_conn.commit()
+                stats.network, stats.last_updated, stats.evaluation_score
+            ) for stats in stats_list])
+            cursor.executemany(_SQL_INSERT_SOURCE_FILE, [
+                (stats.fen, stats.move, stats.network, source_file)
+                for stats in stats_list for source_file in stats.source_files
+            ])
+            self._commit()
             
         except Exception as e:
             logger.error(f"Error updating move stats: {e}")
     
+    def upsert_move_stats_batch(self, items):
+        """Add aggregated ((fen, move, network), [wins, losses, draws, sources, timestamp]) counts to move_stats"""
+        if not self.sqlite_conn:
+            return
+        
+        try:
+            rows = []
+            source_rows = []
+            for (fen, move, network), (wins, losses, draws, sources, timestamp) in items:
+                rows.append((fen, move, wins, losses, draws, network, timestamp))
+                source_rows.extend((fen, move, network, source) for source in sources)
+            
+            cursor = self._cursor()
+            cursor.executemany(_SQL_ACCUMULATE, rows)
+            cursor.executemany(_SQL_INSERT_SOURCE_FILE, source_rows)
+            self._commit()
+            
+        except Exception as e:
+            logger.error(f"Error upserting move stats: {e}")
+    
+    def get_position_totals(self, fen: str, network: str = None) -> Tuple[int, int]:
+        """Get (moves with data, total games) for a position with a single SQL aggregate"""
+        if not self.sqlite_conn:
+            return 0, 0
+        
+        try:
+            cursor = self._cursor()
+            
+            if network:
+                cursor.execute(_SQL_POSITION_TOTALS_NET, (fen, network))
+            else:
+                cursor.execute(_SQL_POSITION_TOTALS, (fen,))
+            
+            moves_with_data, total_games = cursor.fetchone()
+            return moves_with_data, total_games
+            
+        except Exception as e:
+            logger.error(f"Error getting position totals: {e}")
+            return 0, 0
+    
     def get_all_moves_for_position(self, fen: str, network: str = None) -> List[MoveStats]:
         """Get all move statistics for a position"""
+        return list(self.iter_moves_for_position(fen, network))
+    
+    def iter_moves_for_position(self, fen: str, network: str = None,
+                                batch_size: int = 256) -> Iterator[MoveStats]:
+        """Yield move statistics for a position, fetching rows in batches"""
         if not self.sqlite_conn:
-            return []
+            return
         
         try:
+            # Own cursor: the caller may run other queries between batches
             cursor = self.sqlite_conn.cursor()
             
             if network:
-                cursor.execute("""
-                    SELECT fen, move, wins, losses, draws, network, source_files, 
-                           last_updated, evaluation_score
-                    FROM move_stats 
-                    WHERE fen = ? AND network = ?
-                    ORDER BY (wins + 0.5 * draws) / (wins + losses + draws) DESC
-                """, (fen, network))
+                cursor.execute(_SQL_ALL_MOVES_NET, (fen, network))
             else:
-                cursor.execute("""
-                    SELECT fen, move, wins, losses, draws, network, source_files, 
-                           last_updated, evaluation_score
-                    FROM move_stats 
-                    WHERE fen = ?
-                    ORDER BY (wins + 0.5 * draws) / (wins + losses + draws) DESC
-                """, (fen,))
-            
-            stats = []
-            for row in cursor.fetchall():
-                source_files = json.loads(row[6]) if row[6] else []
-                stats.append(MoveStats(
-                    fen=row[0],
-                    move=row[1],
-                    wins=row[2],
-                    losses=row[3],
-                    draws=row[4],
-                    network=row[5],
-                    source_files=source_files,
-                    last_updated=row[7],
-                    evaluation_score=row[8]
-                ))
+                cursor.execute(_SQL_ALL_MOVES, (fen,))
             
-            return stats
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from map(_row_to_move_stats, rows)
             
         except Exception as e:
-            logger.error(f"Error getting all moves for position: {e}")
-            return []
+            logger.error(f"Error iterating moves for position: {e}")
+
+def _iter_pgn_games(file_obj) -> Iterator[bytes]:
+    """Split a binary PGN stream into the raw bytes of each game"""
+    lines = []
+    for line in file_obj:
+        if line.startswith(b'[Event') and lines:
+            yield b''.join(lines)
+            lines = []
+        lines.append(line)
+    if lines:
+        yield b''.join(lines)
 
 class ArchiveDownloader:
     """Downloads and processes chess archives"""
@@ -890,6 +1345,8 @@ class ArchiveDownloader:
     def download_archive(self, url: str, filename: str) -> bool:
         """Download an archive file"""
         filepath = self.archive_dir / filename
+        # Only a finished download is moved into place, so an existing archive is complete
+        part_filepath = filepath.with_name(filename + '.part')
         
         if filepath.exists():
             logger.debug(f"Archive already exists: {filename}")
@@ -897,23 +1354,79 @@ class ArchiveDownloader:
         
         try:
             logger.info(f"Downloading archive: {filename}")
-            response = requests.get(url, stream=True, timeout=60)
-            response.raise_for_status()
             
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            # Several range requests fill the link where one TCP stream cannot
+            head = requests.head(url, allow_redirects=True, timeout=30)
+            total = int(head.headers.get('content-length', 0))
+            if head.ok and total and head.headers.get('accept-ranges') == 'bytes':
+                self._download_ranges(head.url, part_filepath, total)
+            else:
+                response = requests.get(url, stream=True, timeout=60)
+                response.raise_for_status()
+                
+                with open(part_filepath, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        if chunk:
+                            f.write(chunk)
             
+            os.replace(part_filepath, filepath)
             logger.info(f"Successfully downloaded archive: {filename}")
             return True
             
-        except Exception as e:
+        except BaseException as e:
+            part_filepath.unlink(missing_ok=True)
+            if not isinstance(e, Exception):
+                raise
             logger.error(f"Failed to download archive {filename}: {e}")
-            if filepath.exists():
-                filepath.unlink()
             return False
     
+    def _download_ranges(self, url: str, filepath: Path, total: int, parts: int = 4):
+        """Download a file as concurrent byte ranges written in place"""
+        # Preallocate so each range can be written at its own offset
+        with open(filepath, 'wb') as f:
+            f.truncate(total)
+        
+        def fetch(byte_range: Tuple[int, int]):
+            start, end = byte_range
+            # Offsets only line up if the bytes arrive without content encoding
+            headers = {'Range': f'bytes={start}-{end}', 'Accept-Encoding': 'identity'}
+            response = requests.get(url, headers=headers, stream=True, timeout=60)
+            with response:
+                if response.status_code != 206:
+                    raise ValueError(f"Server ignored range request ({response.status_code})")
+                written = 0
+                with open(filepath, 'r+b') as f:
+                    f.seek(start)
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+                        written += len(chunk)
+            # A short range would leave a hole of zeros in the archive
+            if written != end - start + 1:
+                raise IOError(f"Range {start}-{end} ended after {written} bytes")
+        
+        step = -(-total // parts)
+        ranges = [(start, min(start + step, total) - 1) for start in range(0, total, step)]
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            # list() re-raises the first failed range
+            list(executor.map(fetch, ranges))
+    
+    @staticmethod
+    def _open_decompressed(raw, filename: str) -> io.BufferedReader:
+        """Wrap a binary stream in the decompressor its extension calls for"""
+        if filename.endswith('.zst'):
+            stream = zstd.ZstdDecompressor().stream_reader(
+                raw, read_size=1 << 20, read_across_frames=True, closefd=False)
+        elif filename.endswith('.gz'):
+            stream = gzip.GzipFile(fileobj=raw)
+        elif filename.endswith('.bz2'):
+            stream = bz2.BZ2File(raw)
+        elif filename.endswith('.xz'):
+            stream = lzma.LZMAFile(raw)
+        else:
+            stream = raw
+        # Lines stay bytes; only the games that get parsed are decoded
+        return io.BufferedReader(stream, buffer_size=1 << 20)
+    
     def process_archive(self, filename: str, network: str) -> int:
         """Process an archive file and extract game data"""
         filepath = self.archive_dir / filename
@@ -926,25 +1439,11 @@ class ArchiveDownloader:
             return 0
         
         try:
-            processed_games = 0
-            
-            # Determine compression type and open file
-            if filename.endswith('.zst'):
-                with zstd.open(filepath, 'rt', encoding='utf-8') as f:
-                    processed_games = self._process_pgn_file(f, network, filename)
-            elif filename.endswith('.gz'):
-                with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-                    processed_games = self._process_pgn_file(f, network, filename)
-            elif filename.endswith('.bz2'):
-                with bz2.open(filepath, 'rt', encoding='utf-8') as f:
-                    processed_games = self._process_pgn_file(f, network, filename)
-            elif filename.endswith('.xz'):
-                with lzma.open(filepath, 'rt', encoding='utf-8') as f:
-                    processed_games = self._process_pgn_file(f, network, filename)
-            else:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    processed_games = self._process_pgn_file(f, network, filename)
+            with open(filepath, 'rb') as raw, self._open_decompressed(raw, filename) as f:
+                processed_games = self._process_pgn_file(f, network, filename)
             
+            self.archive_index.flush()
+            self.cache_manager.sync()
             logger.info(f"Processed {processed_games} games from {filename}")
             return processed_games
             
@@ -952,58 +1451,74 @@ class ArchiveDownloader:
             logger.error(f"Error processing archive {filename}: {e}")
             return 0
     
-    def _process_pgn_file(self, file_obj, network: str, filename: str) -> int:
+    def _process_pgn_file(self, file_obj, network: str, filename: str,
+                          max_pending_keys: int = 200_000) -> int:
         """Process a PGN file and extract game data"""
         processed_games = 0
-        current_game_lines = []
-        
-        for line in file_obj:
-            line = line.strip()
-            
-            if line.startswith('[Event'):
-                # Process previous game if exists
-                if current_game_lines:
-                    game_result = self.parse_game_lines(current_game_lines, network, filename)
-                    if game_result:
-                        self.cache_manager.store_game_result(game_result)
-                        processed_games += 1
-                
-                # Start new game
-                current_game_lines = [line]
-            elif line and current_game_lines:
-                current_game_lines.append(line)
-        
-        # Process last game
-        if current_game_lines:
-            game_result = self.parse_game_lines(current_game_lines, network, filename)
-            if game_result:
-                self.cache_manager.store_game_result(game_result)
-                processed_games += 1
+        # (fen, move, network) -> [wins, losses, draws, source files, last timestamp];
+        # positions recur across games, so this collapses most row writes
+        agg = {}
+        
+        def flush():
+            self.cache_manager.begin_batch()
+            try:
+                self.cache_manager.upsert_move_stats_batch(agg.items())
+            finally:
+                self.cache_manager.end_batch()
+            agg.clear()
+        
+        for game_bytes in _iter_pgn_games(file_obj):
+            # Unfinished games are dropped before paying for decode and parse
+            if b'[Result "*"]' in game_bytes:
+                continue
+            
+            game = chess.pgn.read_game(io.StringIO(game_bytes.decode('utf-8', 'replace')))
+            if game is None:
+                continue
+            game_results = self.parse_game(game, network, filename)
+            if not game_results:
+                continue
+            
+            for game_result in game_results:
+                key = (game_result.fen, game_result.move, game_result.network)
+                entry = agg.get(key)
+                if entry is None:
+                    entry = agg[key] = [0, 0, 0, set(), 0.0]
+                if game_result.result == "1-0":
+                    entry[0] += 1
+                elif game_result.result == "0-1":
+                    entry[1] += 1
+                elif game_result.result == "1/2-1/2":
+                    entry[2] += 1
+                entry[3].add(game_result.source_file)
+                entry[4] = game_result.timestamp
+            processed_games += 1
+            
+            # Bound memory on very large archives
+            if len(agg) >= max_pending_keys:
+                flush()
+        
+        if agg:
+            flush()
         
         return processed_games
     
-    def parse_game_lines(self, game_lines: List[str], network: str, filename: str) -> Optional[GameResult]:
-        """Parse game lines and extract relevant data"""
+    def parse_game(self, game: chess.pgn.Game, network: str, filename: str) -> List[GameResult]:
+        """Extract one GameResult per move of a parsed game"""
         try:
-            # Create a temporary PGN string
-            pgn_text = '\n'.join(game_lines) + '\n\n'
-            
-            # Parse with chess.pgn
-            game = chess.pgn.read_game(pgn_text.splitlines())
-            if not game:
-                return None
-            
-            # Extract game result
+            # Skip unfinished games before walking their moves
             result = game.headers.get('Result', '')
             if not result or result == '*':
-                return None
+                return []
             
-            # Process each move in the game
-            board = chess.Board()
+            board = game.board()
             game_results = []
+            fen_updates = []
+            timestamp = time.time()  # One timestamp per game
             
             for move in game.mainline_moves():
-                fen = normalize_fen(board.fen())
+                # EPD is the FEN without move counters, i.e. normalize_fen minus the "0 1"
+                fen = fast_epd(board) + ' 0 1'
                 move_uci = move.uci()
                 
                 game_result = GameResult(
@@ -1012,40 +1527,43 @@ class ArchiveDownloader:
                     result=result,
                     network=network,
                     source_file=filename,
-                    timestamp=time.time()
+                    timestamp=timestamp
                 )
                 game_results.append(game_result)
-                
-                # Add to archive index
-                self.archive_index.add_fen_data(fen, network, filename, 1)
+                fen_updates.append((fen, network, filename))
                 
                 board.push(move)
             
-            # Return the first game result (we'll process all in the calling function)
-            return game_results[0] if game_results else None
+            # Add the whole game to the archive index in one call
+            self.archive_index.add_fen_data_batch(fen_updates)
+            return game_results
             
         except Exception as e:
-            logger.error(f"Error parsing game lines: {e}")
-            return None
+            logger.error(f"Error parsing game: {e}")
+            return []
 
 class DataManager:
     """Enhanced data management system with position-specific downloads"""
     
     def __init__(self):
         self.cache_manager = CacheManager()
-        self.archive_index = ArchiveIndex()
+        self.archive_index = ArchiveIndex(self.cache_manager.lmdb_env)
         self.archive_downloader = ArchiveDownloader(self.cache_manager, self.archive_index)
         self.dataset_manager = DatasetManager()
         self._dataset_errors = {}
-        self._position_cache = {}  # Cache for position-specific data
-        self._download_queue = []  # Queue for position-specific downloads
+        self._position_cache = TTLCache(maxsize=4096, ttl=float('inf'))  # LRU of position-specific data
+        self._download_queue = deque(maxlen=1024)  # Queue for position-specific downloads
+        self._queued_set = set()  # FENs currently in _download_queue
         self._downloading = False
         self._lock = threading.Lock()
         
-        # Initialize storage
-        self.cache_manager.init_storage()
+        # Storage is initialized by CacheManager itself
         self._initialize_datasets()
     
+    def close(self):
+        """Release the storage connections"""
+        self.cache_manager.close()
+    
     def _initialize_datasets(self):
         """Initialize datasets with position-specific focus"""
         try:
@@ -1102,11 +1620,13 @@ class DataManager:
         """Get position statistics with position-specific data fetching"""
         try:
             normalized_fen = normalize_fen(fen)
-            cache_key = f"{normalized_fen}:{network or 'all'}:{min_games}"
+            # The FEN string is shared with normalize_fen's cache, so the key adds only a tuple
+            cache_key = (normalized_fen, network, min_games)
             
             # Check cache first
-            if cache_key in self._position_cache:
-                return self._position_cache[cache_key]
+            cached = self._position_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
             # Get legal moves for the position
             board = chess.Board(normalized_fen)
@@ -1127,7 +1647,7 @@ class DataManager:
                 stats = [stat for stat in stats if stat.total_games >= min_games]
             
             # Cache the result
-            self._position_cache[cache_key] = stats
+            self._position_cache.set(cache_key, stats)
             
             return stats
             
@@ -1135,6 +1655,35 @@ class DataManager:
             logger.error(f"Error getting position stats for {fen}: {e}")
             return []
     
+    def iter_position_stats(self, fen: str, network: str = None) -> Iterator[MoveStats]:
+        """Yield position statistics straight from the database cursor"""
+        normalized_fen = normalize_fen(fen)
+        found = False
+        
+        for stat in self.cache_manager.iter_moves_for_position(normalized_fen, network):
+            found = True
+            yield stat
+        
+        # Nothing stored yet: fetch (and store) it the usual way
+        if not found:
+            yield from self.get_position_stats(normalized_fen, network)
+    
+    def get_aggregate(self, fen: str, network: str = None) -> Tuple[int, int]:
+        """Get (moves with data, total games) for a position without building MoveStats"""
+        try:
+            normalized_fen = normalize_fen(fen)
+            moves_with_data, total_games = self.cache_manager.get_position_totals(normalized_fen, network)
+            
+            # No stored data yet: the full lookup fetches and stores it, so re-read the aggregate
+            if moves_with_data == 0 and self.get_position_stats(normalized_fen, network):
+                moves_with_data, total_games = self.cache_manager.get_position_totals(normalized_fen, network)
+            
+            return moves_with_data, total_games
+            
+        except Exception as e:
+            logger.error(f"Error getting aggregate for {fen}: {e}")
+            return 0, 0
+    
     def _fetch_position_specific_data(self, fen: str, legal_moves: List[str], network: str = None) -> List[MoveStats]:
         """Fetch only the data needed for the current position and its legal moves"""
         try:
@@ -1143,10 +1692,13 @@ class DataManager:
             # Check if we have any relevant data in our sample or cached data
             stats = []
             
+            # Draw the random win/loss adjustments for every move at once
+            deltas = _rng.integers(-5, 6, size=(len(legal_moves), 2))
+            
             # Generate sample stats for the legal moves
-            for move in legal_moves:
+            for move, delta in zip(legal_moves, deltas):
                 # Create sample statistics based on move characteristics
-                sample_stat = self._generate_sample_stat_for_move(fen, move, network)
+                sample_stat = self._generate_sample_stat_for_move(fen, move, network, delta)
                 if sample_stat:
                     stats.append(sample_stat)
             
@@ -1161,7 +1713,8 @@ class DataManager:
             logger.error(f"Error fetching position-specific data: {e}")
             return []
     
-    def _generate_sample_stat_for_move(self, fen: str, move: str, network: str = None) -> MoveStats:
+    def _generate_sample_stat_for_move(self, fen: str, move: str, network: str = None,
+                                       delta=None) -> MoveStats:
         """Generate sample statistics for a specific move"""
         try:
             # Create realistic sample data based on move characteristics
@@ -1169,43 +1722,16 @@ class DataManager:
             move_obj = chess.Move.from_uci(move)
             
             # Determine move type for realistic statistics
-            piece = board.piece_at(move_obj.from_square)
-            if not piece:
+            piece_type = board.piece_type_at(move_obj.from_square)
+            if not piece_type:
                 return None
             
-            piece_type = piece.piece_type
             is_capture = board.is_capture(move_obj)
-            # Correct check detection: push move, check is_check(), then pop
-            board.push(move_obj)
-            is_check = board.is_check()
-            board.pop()
+            # Checks are read from attack tables without pushing the move
+            is_check = board.gives_check(move_obj)
             
             # Generate realistic statistics based on move characteristics
-            if piece_type == chess.PAWN:
-                # Pawn moves are generally safer
-                wins = 45
-                losses = 35
-                draws = 20
-            elif piece_type == chess.KNIGHT or piece_type == chess.BISHOP:
-                # Minor pieces
-                wins = 40
-                losses = 40
-                draws = 20
-            elif piece_type == chess.ROOK:
-                # Rook moves
-                wins = 42
-                losses = 38
-                draws = 20
-            elif piece_type == chess.QUEEN:
-                # Queen moves (more risky)
-                wins = 38
-                losses = 42
-                draws = 20
-            else:  # KING
-                # King moves (very risky)
-                wins = 35
-                losses = 45
-                draws = 20
+            wins, losses, draws = _BASE_STATS_BY_PIECE[piece_type]
             
             # Adjust for captures (generally more tactical)
             if is_capture:
@@ -1218,9 +1744,10 @@ class DataManager:
                 losses += 3
             
             # Add some randomness for variety
-            import random
-            wins += random.randint(-5, 5)
-            losses += random.randint(-5, 5)
+            if delta is None:
+                delta = _rng.integers(-5, 6, size=2)
+            wins += int(delta[0])
+            losses += int(delta[1])
             draws = max(0, 100 - wins - losses)
             
             # Ensure positive numbers
@@ -1249,25 +1776,18 @@ class DataManager:
         try:
             logger.info(f"Downloading position-specific data for {fen}")
             
-            # Get legal moves for the position
+            # Nothing to fetch for a finished position
             board = chess.Board(fen)
-            legal_moves = [move.uci() for move in board.legal_moves]
-            
-            if not legal_moves:
+            if not any(board.legal_moves):
                 logger.info("No legal moves for position")
                 return True
             
-            # Check if we already have data for this position
-            existing_stats = self.get_position_stats(fen, network)
-            if existing_stats:
-                logger.info(f"Position data already available: {len(existing_stats)} moves")
-                return True
-            
-            # For now, generate sample data (in a real implementation, this would fetch from APIs)
-            stats = self._fetch_position_specific_data(fen, legal_moves, network)
+            # get_position_stats already falls back to fetching and storing
+            # position-specific data when nothing is cached
+            stats = self.get_position_stats(fen, network)
             
             if stats:
-                logger.info(f"Generated position-specific data: {len(stats)} moves")
+                logger.info(f"Position data available: {len(stats)} moves")
                 return True
             else:
                 logger.warning("Failed to generate position-specific data")
@@ -1282,38 +1802,46 @@ class DataManager:
         try:
             # Queue the position for background processing
             with self._lock:
-                if fen not in self._download_queue:
+                if fen not in self._queued_set:
+                    # A full deque drops its oldest entry; keep the set in step
+                    if len(self._download_queue) == self._download_queue.maxlen:
+                        self._queued_set.discard(self._download_queue[0])
+                    self._queued_set.add(fen)
                     self._download_queue.append(fen)
             
             # Start background processing if not already running
-            if not self._downloading:
-                self._start_background_processing()
+            self._start_background_processing()
                 
         except Exception as e:
             logger.error(f"Error queuing position data fetch: {e}")
     
     def _start_background_processing(self):
         """Start background processing of queued positions"""
-        if self._downloading:
-            return
-        
-        self._downloading = True
+        # Check and set under the lock so two callers can't both start a worker
+        with self._lock:
+            if self._downloading:
+                return
+            self._downloading = True
         
         def background_worker():
             try:
-                while self._download_queue:
+                while True:
                     with self._lock:
+                        # Clear the flag in the same critical section that sees the
+                        # queue empty, so a concurrent enqueue starts a new worker
                         if not self._download_queue:
-                            break
-                        fen = self._download_queue.pop(0)
+                            self._downloading = False
+                            return
+                        fen = self._download_queue.popleft()
+                        self._queued_set.discard(fen)
                     
                     # Process the position
                     self.download_position_specific_data(fen)
                     
             except Exception as e:
                 logger.error(f"Error in background processing: {e}")
-            finally:
-                self._downloading = False
+                with self._lock:
+                    self._downloading = False
         
         # Start background thread
         thread = threading.Thread(target=background_worker, daemon=True)
@@ -1333,9 +1861,12 @@ class DataManager:
             board = chess.Board(fen)
             legal_moves = [move.uci() for move in board.legal_moves]
             
+            legal_moves = legal_moves[:8]  # Limit to 8 moves for sample
+            deltas = _rng.integers(-5, 6, size=(len(legal_moves), 2))
+            
             stats = []
-            for move in legal_moves[:8]:  # Limit to 8 moves for sample
-                sample_stat = self._generate_sample_stat_for_move(fen, move, network)
+            for move, delta in zip(legal_moves, deltas):
+                sample_stat = self._generate_sample_stat_for_move(fen, move, network, delta)
                 if sample_stat:
                     stats.append(sample_stat)
             
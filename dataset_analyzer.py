@@ -6,24 +6,134 @@ import zstandard as zstd
 import gzip
 import bz2
 import lzma
+import io
+import mmap
+import multiprocessing
+import os
 import chess
 import chess.pgn
+import chess.polyglot
 import sqlite3
 import threading
+import queue
 import time
-import random
+import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional
-from collections import defaultdict
+from typing import List, Dict, Optional, Tuple, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait, as_completed
 from dataclasses import dataclass
+from contextlib import closing
 import requests
 import logging
 
-from utils import normalize_fen, get_logger
+from utils import normalize_fen, get_logger, fast_epd, TTLCache
 
 logger = get_logger(__name__)
 
-@dataclass
+_rng = np.random.default_rng()
+
+# Lichess dumps use long-distance windows; cap what the decoder may allocate
+_MAX_WINDOW_SIZE = 2**31
+_READ_SIZE = 1 << 20
+_SAVE_CHUNK_ROWS = 20000
+_DOWNLOAD_CHUNK_SIZE = 1 << 20
+_DOWNLOAD_CONNECTIONS = 4
+_PARALLEL_DOWNLOAD_MIN_SIZE = 64 << 20
+# Byte offsets only line up if the server sends the file as-is
+_IDENTITY_HEADERS = {'Accept-Encoding': 'identity'}
+_GAMES_PER_BATCH = 500
+_FLUSH_GAMES = 100_000
+_PREFETCH_BATCHES = 16
+# Workers start while the prefetch thread runs and the database and mmap are
+# open, so they must not be forked from this process
+_WORKER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Statements reused on the processor's long-lived connection
+# Adds to existing counts so a dataset can be persisted in several flushes
+_SQL_SAVE_STATS = """
+    INSERT INTO position_stats
+    (pos_key, move, wins, losses, draws, dataset, last_updated)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(pos_key, move, dataset) DO UPDATE SET
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        draws = draws + excluded.draws,
+        last_updated = excluded.last_updated
+"""
+_SQL_CREATE_POSITION_STATS = """
+    CREATE TABLE IF NOT EXISTS position_stats (
+        pos_key INTEGER,
+        move TEXT,
+        wins INTEGER DEFAULT 0,
+        losses INTEGER DEFAULT 0,
+        draws INTEGER DEFAULT 0,
+        dataset TEXT,
+        last_updated REAL,
+        PRIMARY KEY (pos_key, move, dataset)
+    ) WITHOUT ROWID
+"""
+_SQL_CLEAR_DATASET = "DELETE FROM position_stats WHERE dataset = ?"
+_SQL_UPDATE_METADATA = """
+    INSERT OR REPLACE INTO dataset_metadata
+    (name, total_games, processed_games, processing_date)
+    VALUES (?, ?, ?, ?)
+"""
+# Per-move totals summed across datasets; the primary key already serves pos_key lookups
+_SQL_POSITION_STATS = """
+    SELECT move, SUM(wins), SUM(losses), SUM(draws), GROUP_CONCAT(DISTINCT dataset)
+    FROM position_stats
+    WHERE pos_key = ?
+    GROUP BY move
+"""
+_SQL_POSITION_STATS_DATASET = """
+    SELECT move, SUM(wins), SUM(losses), SUM(draws), GROUP_CONCAT(DISTINCT dataset)
+    FROM position_stats
+    WHERE pos_key = ? AND dataset = ?
+    GROUP BY move
+"""
+# Best move by performance (ties by move, like the stable sort above) plus the
+# position's total game count, for summaries that need nothing else
+_SQL_POSITION_SUMMARY = """
+    SELECT move, wins, losses, draws, SUM(wins + losses + draws) OVER ()
+    FROM (
+        SELECT move, SUM(wins) AS wins, SUM(losses) AS losses, SUM(draws) AS draws
+        FROM position_stats
+        WHERE pos_key = ?
+        GROUP BY move
+        HAVING SUM(wins + losses + draws) > 0
+    )
+    ORDER BY (wins + 0.5 * draws) / (wins + losses + draws) DESC, move
+    LIMIT 1
+"""
+_SQL_POSITION_SUMMARY_DATASET = """
+    SELECT move, wins, losses, draws, SUM(wins + losses + draws) OVER ()
+    FROM (
+        SELECT move, SUM(wins) AS wins, SUM(losses) AS losses, SUM(draws) AS draws
+        FROM position_stats
+        WHERE pos_key = ? AND dataset = ?
+        GROUP BY move
+        HAVING SUM(wins + losses + draws) > 0
+    )
+    ORDER BY (wins + 0.5 * draws) / (wins + losses + draws) DESC, move
+    LIMIT 1
+"""
+
+# Bumped whenever position_stats changes shape; stored in PRAGMA user_version
+_SCHEMA_VERSION = 2
+
+def _position_key(board: chess.Board) -> int:
+    """Polyglot Zobrist hash of a position, masked to fit a signed SQLite INTEGER"""
+    return chess.polyglot.zobrist_hash(board) & 0x7FFF_FFFF_FFFF_FFFF
+
+def _fen_position_key(fen: str) -> int:
+    """Position key for a FEN string"""
+    return _position_key(chess.Board(fen))
+
+# Index into a [wins, losses, draws] counter; anything else counts as a draw
+_RESULT_INDEX = {"1-0": 0, "0-1": 1}
+
+@dataclass(slots=True, frozen=True)
 class DatasetMove:
     """Represents a move with dataset-based evaluation"""
     move: str
@@ -46,6 +156,109 @@ class DatasetEvaluation:
     network: str
     timestamp: float
 
+def _iter_game_batches(handle, batch_size: int) -> Iterator[List[str]]:
+    """Split a PGN text stream into lists of raw game texts"""
+    batch = []
+    lines = []
+    for line in handle:
+        if line.startswith('[Event ') and lines:
+            batch.append(''.join(lines))
+            lines = []
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        lines.append(line)
+    if lines:
+        batch.append(''.join(lines))
+    if batch:
+        yield batch
+
+def _prefetch(iterable, maxsize: int) -> Iterator:
+    """Run an iterator on a background thread, buffering up to maxsize items.
+    
+    Close the returned generator to stop the thread early.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+    end = object()
+    
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(end)
+        except BaseException as e:
+            put((end, e))
+    
+    thread = threading.Thread(target=produce, name="dataset-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is end:
+                return
+            if type(item) is tuple and item[0] is end:
+                raise item[1]
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def _count_game_batch(games: List[str]) -> Tuple[Dict[Tuple[int, str], List[int]], int, int]:
+    """Parse a batch of PGN games and count [wins, losses, draws] per (pos_key, move)"""
+    position_stats: Dict[Tuple[int, str], List[int]] = {}
+    # Zobrist keys memoized by python-chess's transposition key
+    pos_keys: Dict[tuple, int] = {}
+    processed_games = 0
+    # Reused across games; reset() is much cheaper than building a new Board
+    start_board = chess.Board()
+    
+    for text in games:
+        # Abandoned or unfinished games carry no result to credit
+        if '[Result "*"]' in text:
+            continue
+        
+        game = chess.pgn.read_game(io.StringIO(text))
+        if game is None or game.errors:
+            continue
+        
+        result_idx = _RESULT_INDEX.get(game.headers.get("Result"), 2)
+        
+        if "FEN" in game.headers:
+            board = game.board()  # Set-up position or variant, rare in standard dumps
+        else:
+            board = start_board
+            board.reset()
+        
+        for move in game.mainline_moves():
+            transposition_key = board._transposition_key()
+            pos_key = pos_keys.get(transposition_key)
+            if pos_key is None:
+                pos_key = _position_key(board)
+                pos_keys[transposition_key] = pos_key
+            
+            key = (pos_key, move.uci())
+            stats = position_stats.get(key)
+            if stats is None:
+                stats = [0, 0, 0]
+                position_stats[key] = stats
+            stats[result_idx] += 1
+            board.push(move)
+        
+        processed_games += 1
+    
+    return position_stats, len(games), processed_games
+
 class DatasetDownloader:
     """Downloads and manages chess datasets"""
     
@@ -89,6 +302,8 @@ class DatasetDownloader:
         source = self.dataset_sources[dataset_name]
         filename = f"{dataset_name}.pgn.zst"
         filepath = self.dataset_dir / filename
+        part_path = filepath.with_name(filename + '.part')
+        ranges_path = filepath.with_name(filename + '.ranges')
         
         if filepath.exists():
             logger.info(f"Dataset already exists: {dataset_name}")
@@ -96,32 +311,148 @@ class DatasetDownloader:
         
         try:
             logger.info(f"Downloading dataset: {dataset_name} ({source['size_mb']}MB)")
-            response = requests.get(source["url"], stream=True, timeout=60)
-            response.raise_for_status()
+            url = source["url"]
             
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
+            head = requests.head(url, allow_redirects=True, timeout=(10, 60),
+                                 headers=_IDENTITY_HEADERS)
+            head.raise_for_status()
+            total_size = int(head.headers.get('content-length', 0))
+            accepts_ranges = head.headers.get('accept-ranges', '').lower() == 'bytes'
+            
+            # Ranges go to their own file, so the stream path only ever resumes its own .part
+            # One left behind by a killed run has holes and is never reused
+            ranges_path.unlink(missing_ok=True)
             
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            if downloaded % (1024 * 1024) == 0:  # Log every MB
-                                logger.info(f"Download progress: {progress:.1f}%")
+            # Fetch large files as parallel ranges unless a resumable .part is present
+            if (accepts_ranges and not part_path.exists()
+                    and total_size >= _PARALLEL_DOWNLOAD_MIN_SIZE):
+                try:
+                    self._download_ranges(url, ranges_path, total_size)
+                    self._verify_download(ranges_path, total_size)
+                except BaseException as e:
+                    # A preallocated file has holes, so it is never resumed or installed
+                    ranges_path.unlink(missing_ok=True)
+                    if not isinstance(e, Exception):
+                        raise
+                    logger.warning(f"Parallel download failed for {dataset_name}, using a single stream: {e}")
+                else:
+                    os.replace(ranges_path, filepath)
+                    logger.info(f"Downloaded dataset: {dataset_name}")
+                    return True
+            
+            part_size = part_path.stat().st_size if part_path.exists() else 0
+            if total_size and part_size > total_size:
+                # Longer than the remote file, so it cannot be a prefix of it
+                part_path.unlink()
+                part_size = 0
+            # A .part completed by a run killed before os.replace only needs verifying
+            if not total_size or part_size < total_size:
+                self._download_stream(url, part_path, total_size, accepts_ranges)
+            try:
+                self._verify_download(part_path, total_size)
+            except zstd.ZstdError:
+                # A corrupt .part would fail the same way on every resume
+                part_path.unlink(missing_ok=True)
+                raise
             
+            os.replace(part_path, filepath)
             logger.info(f"Downloaded dataset: {dataset_name}")
             return True
             
         except Exception as e:
+            # The .part file is kept so the next attempt can resume it
             logger.error(f"Failed to download dataset {dataset_name}: {e}")
-            if filepath.exists():
-                filepath.unlink()
             return False
     
+    @staticmethod
+    def _verify_download(path: Path, total_size: int):
+        """Check the size and decode the whole archive before it is installed"""
+        size = path.stat().st_size
+        if total_size and size != total_size:
+            raise IOError(f"Downloaded {size} of {total_size} bytes")
+        
+        dctx = zstd.ZstdDecompressor(max_window_size=_MAX_WINDOW_SIZE)
+        with open(path, 'rb') as raw, dctx.stream_reader(raw, read_size=_READ_SIZE) as reader:
+            while reader.read(_READ_SIZE):
+                pass
+    
+    def _download_stream(self, url: str, part_path: Path, total_size: int, accepts_ranges: bool):
+        """Download over one connection, resuming an existing .part file if possible"""
+        downloaded = part_path.stat().st_size if part_path.exists() else 0
+        headers = dict(_IDENTITY_HEADERS)
+        if downloaded and accepts_ranges:
+            headers['Range'] = f"bytes={downloaded}-"
+        
+        response = requests.get(url, stream=True, timeout=(10, 60), headers=headers)
+        if response.status_code == 416:
+            # The .part doesn't fit the remote file; start over
+            response.close()
+            part_path.unlink(missing_ok=True)
+            headers.pop('Range')
+            response = requests.get(url, stream=True, timeout=(10, 60), headers=headers)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        
+        if response.status_code == 206:
+            logger.info(f"Resuming download at {downloaded / (1024 * 1024):.1f}MB")
+            mode = 'ab'
+        else:
+            downloaded = 0
+            mode = 'wb'
+        
+        if not total_size:
+            total_size = int(response.headers.get('content-length', 0))
+        next_report = 10
+        
+        # Write to a .part file so an interrupted download never looks complete
+        with open(part_path, mode) as f:
+            while True:
+                chunk = response.raw.read(_DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                downloaded += len(chunk)
+                
+                if total_size > 0:
+                    progress = (downloaded / total_size) * 100
+                    if progress >= next_report:
+                        logger.info(f"Download progress: {progress:.1f}%")
+                        next_report = int(progress) // 10 * 10 + 10
+    
+    def _download_ranges(self, url: str, ranges_path: Path, total_size: int):
+        """Download byte ranges over parallel connections into a preallocated file"""
+        with open(ranges_path, 'wb') as f:
+            f.truncate(total_size)
+        
+        range_size = -(-total_size // _DOWNLOAD_CONNECTIONS)
+        ranges = [(start, min(start + range_size, total_size) - 1)
+                  for start in range(0, total_size, range_size)]
+        
+        def fetch(byte_range):
+            start, end = byte_range
+            headers = dict(_IDENTITY_HEADERS, Range=f"bytes={start}-{end}")
+            response = requests.get(url, stream=True, timeout=(10, 60), headers=headers)
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(f"Server ignored range request (HTTP {response.status_code})")
+            
+            written = 0
+            with open(ranges_path, 'r+b') as f:
+                f.seek(start)
+                while True:
+                    chunk = response.raw.read(_DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+            
+            if written != end - start + 1:
+                raise IOError(f"Range {start}-{end} ended after {written} bytes")
+        
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            for i, _ in enumerate(pool.map(fetch, ranges), 1):
+                logger.info(f"Download progress: {i}/{len(ranges)} ranges complete")
+    
     def get_available_datasets(self) -> List[str]:
         """Get list of available datasets"""
         available = []
@@ -154,26 +485,33 @@ class DatasetProcessor:
     def __init__(self):
         self.db_path = Path("cache/dataset_stats.db")
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by all threads, serialized by the lock
+        self._conn_lock = threading.Lock()
+        self._conn = self._connect()
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the write-friendly pragmas applied"""
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        conn.executescript("""
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-262144;
+        """)
+        return conn
+    
     def init_database(self):
         """Initialize SQLite database for dataset statistics"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        with self._conn_lock:
+            self._create_tables()
+    
+    def _create_tables(self):
+        """Create the statistics tables on the shared connection"""
+        cursor = self._conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
         
-        # Table for position statistics
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS position_stats (
-                fen TEXT,
-                move TEXT,
-                wins INTEGER DEFAULT 0,
-                losses INTEGER DEFAULT 0,
-                draws INTEGER DEFAULT 0,
-                dataset TEXT,
-                last_updated REAL,
-                PRIMARY KEY (fen, move, dataset)
-            )
-        """)
+        # Table for position statistics, keyed by Zobrist hash instead of FEN text
+        cursor.execute(_SQL_CREATE_POSITION_STATS)
         
         # Table for dataset metadata
         cursor.execute("""
@@ -185,11 +523,73 @@ class DatasetProcessor:
             )
         """)
         
-        conn.commit()
-        conn.close()
+        self._migrate()
+    
+    def _migrate(self):
+        """Bring an existing database up to _SCHEMA_VERSION"""
+        conn = self._conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            return
+        
+        conn.execute("BEGIN")
+        try:
+            if version < 1:
+                self._migrate_v1(conn)
+            if version < 2:
+                self._migrate_v2(conn)
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Migration error for position_stats: {e}")
+    
+    @staticmethod
+    def _migrate_v1(conn: sqlite3.Connection):
+        """Re-key FEN rows by Zobrist hash"""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(position_stats)")]
+        if 'fen' not in columns:
+            return
+        
+        conn.create_function("position_key", 1, _fen_position_key, deterministic=True)
+        conn.execute("ALTER TABLE position_stats RENAME TO position_stats_fen")
+        conn.execute(_SQL_CREATE_POSITION_STATS)
+        # WHERE true keeps the upsert clause from being parsed as a join constraint
+        conn.execute("""
+            INSERT INTO position_stats
+            (pos_key, move, wins, losses, draws, dataset, last_updated)
+            SELECT position_key(fen), move, wins, losses, draws, dataset, last_updated
+            FROM position_stats_fen WHERE true
+            ON CONFLICT(pos_key, move, dataset) DO UPDATE SET
+                wins = wins + excluded.wins,
+                losses = losses + excluded.losses,
+                draws = draws + excluded.draws
+        """)
+        conn.execute("DROP TABLE position_stats_fen")
+        logger.info("Migrated position_stats: keyed by Zobrist hash.")
     
-    def process_dataset(self, dataset_name: str) -> int:
-        """Process a dataset and extract move statistics"""
+    @staticmethod
+    def _migrate_v2(conn: sqlite3.Connection):
+        """Rebuild position_stats as a WITHOUT ROWID table"""
+        sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'position_stats'"
+        ).fetchone()[0]
+        if 'WITHOUT ROWID' in sql.upper():
+            return
+        
+        conn.execute("ALTER TABLE position_stats RENAME TO position_stats_rowid")
+        conn.execute(_SQL_CREATE_POSITION_STATS)
+        conn.execute("INSERT INTO position_stats SELECT * FROM position_stats_rowid")
+        conn.execute("DROP TABLE position_stats_rowid")
+        logger.info("Migrated position_stats: rebuilt WITHOUT ROWID.")
+    
+    def _set_bulk_load(self, enabled: bool):
+        """Trade durability for write speed while a dataset is being imported"""
+        with self._conn_lock:
+            self._conn.execute(f"PRAGMA synchronous={'OFF' if enabled else 'NORMAL'}")
+    
+    def process_dataset(self, dataset_name: str, workers: Optional[int] = None) -> int:
+        """Process a dataset and extract move statistics using worker processes"""
         filepath = Path("cache/datasets") / f"{dataset_name}.pgn.zst"
         
         if not filepath.exists():
@@ -198,49 +598,57 @@ class DatasetProcessor:
         
         try:
             logger.info(f"Processing dataset: {dataset_name}")
+            # The import clears and rebuilds this dataset's rows, so it can simply be rerun
+            self._set_bulk_load(True)
             
             # Statistics tracking
-            position_stats = defaultdict(lambda: defaultdict(lambda: {"wins": 0, "losses": 0, "draws": 0}))
+            position_stats: Dict[Tuple[int, str], List[int]] = {}
             total_games = 0
             processed_games = 0
+            games_since_flush = 0
+            workers = workers or os.cpu_count() or 1
             
-            # Process the PGN file
-            with zstd.open(filepath, 'rt', encoding='utf-8') as f:
-                game_data = []
-                in_game = False
+            # Counts are accumulated across flushes, so start from a clean slate
+            self._clear_statistics(dataset_name)
+            
+            def merge(batch_result):
+                nonlocal total_games, processed_games, games_since_flush
+                partial, batch_total, batch_processed = batch_result
+                for key, (wins, losses, draws) in partial.items():
+                    stats = position_stats.get(key)
+                    if stats is None:
+                        position_stats[key] = [wins, losses, draws]
+                    else:
+                        stats[0] += wins
+                        stats[1] += losses
+                        stats[2] += draws
+                if (total_games + batch_total) // 10000 > total_games // 10000:
+                    logger.info(f"Processed {total_games + batch_total} games from {dataset_name}")
+                total_games += batch_total
+                processed_games += batch_processed
                 
-                for line in f:
-                    line = line.strip()
-                    
-                    if line.startswith('[Event '):
-                        # Start of new game
-                        if in_game and game_data:
-                            self._process_game(game_data, position_stats, dataset_name)
-                            processed_games += 1
-                        
-                        game_data = [line]
-                        in_game = True
-                        total_games += 1
-                        
-                        if total_games % 10000 == 0:
-                            logger.info(f"Processed {total_games} games from {dataset_name}")
-                    
-                    elif in_game:
-                        game_data.append(line)
-                        
-                        if line == '' and game_data[-2] == '':
-                            # End of game
-                            self._process_game(game_data, position_stats, dataset_name)
-                            processed_games += 1
-                            game_data = []
-                            in_game = False
+                # Persist periodically so memory stays bounded on huge dumps
+                games_since_flush += batch_total
+                if games_since_flush >= _FLUSH_GAMES:
+                    self._save_statistics(position_stats, dataset_name)
+                    position_stats.clear()
+                    games_since_flush = 0
             
-            # Process final game if any
-            if in_game and game_data:
-                self._process_game(game_data, position_stats, dataset_name)
-                processed_games += 1
+            # Split the PGN text into game batches here and parse them in worker processes
+            # The decoder reads straight from the page cache through the mapping
+            with open(filepath, 'rb') as raw, \
+                    mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                dctx = zstd.ZstdDecompressor(max_window_size=_MAX_WINDOW_SIZE)
+                with dctx.stream_reader(mapped, read_size=_READ_SIZE) as reader:
+                    handle = io.TextIOWrapper(reader, encoding='utf-8', newline='\n', errors='replace')
+                    # Decompress and split on a background thread while batches are parsed
+                    batches = _prefetch(_iter_game_batches(handle, _GAMES_PER_BATCH),
+                                        _PREFETCH_BATCHES)
+                    
+                    with closing(batches):
+                        self._count_batches(batches, workers, merge)
             
-            # Save statistics to database
+            # Save the remaining statistics to database
             self._save_statistics(position_stats, dataset_name)
             
             # Update metadata
@@ -252,155 +660,145 @@ class DatasetProcessor:
         except Exception as e:
             logger.error(f"Failed to process dataset {dataset_name}: {e}")
             return 0
+        finally:
+            self._set_bulk_load(False)
     
-    def _process_game(self, game_data: List[str], position_stats: Dict, dataset_name: str):
-        """Process a single game and extract move statistics"""
-        try:
-            # Parse game moves
-            moves = []
-            result = "1/2-1/2"  # Default to draw
-            
-            for line in game_data:
-                if line.startswith('[Result '):
-                    result = line.split('"')[1]
-                elif not line.startswith('[') and line.strip():
-                    # Move text
-                    move_text = line.strip()
-                    if move_text and not move_text.startswith('{'):
-                        moves.extend(move_text.split())
-            
-            # Reconstruct game and extract statistics
-            board = chess.Board()
-            
-            for i, move_text in enumerate(moves):
-                if move_text in ['1-0', '0-1', '1/2-1/2', '*']:
-                    break
-                
-                try:
-                    # Parse move
-                    if '.' in move_text:
-                        continue  # Skip move numbers
-                    
-                    move = board.parse_san(move_text)
-                    fen = normalize_fen(board.fen())
-                    
-                    # Record the move
-                    key = (fen, move.uci(), dataset_name)
-                    if key not in position_stats:
-                        position_stats[key] = {"wins": 0, "losses": 0, "draws": 0}
-                    
-                    # Determine result for this move
-                    if result == "1-0":
-                        position_stats[key]["wins"] += 1
-                    elif result == "0-1":
-                        position_stats[key]["losses"] += 1
-                    else:
-                        position_stats[key]["draws"] += 1
-                    
-                    board.push(move)
-                    
-                except Exception as e:
-                    # Skip invalid moves
-                    continue
-                    
-        except Exception as e:
-            logger.debug(f"Failed to process game: {e}")
+    @staticmethod
+    def _count_batches(batches: Iterator[List[str]], workers: int, merge):
+        """Count each batch, in worker processes when more than one is allowed"""
+        if workers <= 1:
+            for batch in batches:
+                merge(_count_game_batch(batch))
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_WORKER_CONTEXT) as pool:
+            pending = set()
+            for batch in batches:
+                pending.add(pool.submit(_count_game_batch, batch))
+                # Keep a bounded number of batches in flight
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(future.result())
+            for future in as_completed(pending):
+                merge(future.result())
     
-    def _save_statistics(self, position_stats: Dict, dataset_name: str):
+    def _clear_statistics(self, dataset_name: str):
+        """Remove previously stored statistics for a dataset"""
+        with self._conn_lock:
+            self._conn.execute(_SQL_CLEAR_DATASET, (dataset_name,))
+    
+    def _save_statistics(self, position_stats: Dict[Tuple[int, str], List[int]], dataset_name: str):
         """Save position statistics to database"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
-        for (fen, move, dataset), stats in position_stats.items():
-            cursor.execute("""
-                INSERT OR REPLACE INTO position_stats
-                (fen, move, wins, losses, draws, dataset, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (fen, move, stats["wins"], stats["losses"], stats["draws"], dataset, time.time()))
+        now = time.time()
+        rows = [
+            (pos_key, move, wins, losses, draws, dataset_name, now)
+            for (pos_key, move), (wins, losses, draws) in position_stats.items()
+        ]
         
-        conn.commit()
-        conn.close()
+        with self._conn_lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for i in range(0, len(rows), _SAVE_CHUNK_ROWS):
+                    cursor.executemany(_SQL_SAVE_STATS, rows[i:i + _SAVE_CHUNK_ROWS])
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
     
     def _update_metadata(self, dataset_name: str, total_games: int, processed_games: int):
         """Update dataset metadata"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO dataset_metadata
-            (name, total_games, processed_games, processing_date)
-            VALUES (?, ?, ?, ?)
-        """, (dataset_name, total_games, processed_games, time.time()))
-        
-        conn.commit()
-        conn.close()
+        with self._conn_lock:
+            self._conn.execute(_SQL_UPDATE_METADATA,
+                               (dataset_name, total_games, processed_games, time.time()))
     
     def get_position_stats(self, fen: str, dataset_name: str = None) -> List[DatasetMove]:
         """Get move statistics for a position"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        return self._get_key_stats(_fen_position_key(fen), dataset_name)
+    
+    def get_board_stats(self, board: chess.Board, dataset_name: str = None) -> List[DatasetMove]:
+        """Get move statistics for a position given as a board, without parsing a FEN"""
+        return self._get_key_stats(_position_key(board), dataset_name)
+    
+    def _get_key_stats(self, pos_key: int, dataset_name: str = None) -> List[DatasetMove]:
+        """Get move statistics for a Zobrist position key"""
+        with self._conn_lock:
+            if dataset_name:
+                rows = self._conn.execute(_SQL_POSITION_STATS_DATASET,
+                                          (pos_key, dataset_name)).fetchall()
+            else:
+                rows = self._conn.execute(_SQL_POSITION_STATS, (pos_key,)).fetchall()
+        
+        if not rows:
+            return []
+        
+        # Score every move in one vectorized pass over the columns
+        move_col, wins_col, losses_col, draws_col, datasets_col = zip(*rows)
+        wins = np.array(wins_col, dtype=np.int64)
+        losses = np.array(losses_col, dtype=np.int64)
+        draws = np.array(draws_col, dtype=np.int64)
+        total = wins + losses + draws
+        performance = (wins + 0.5 * draws) / np.maximum(total, 1)
+        evaluation = ((performance - 0.5) * 200).astype(np.int64)  # Convert to centipawns
+        confidence = np.where(total >= 100, "high", np.where(total >= 50, "medium", "low"))
+        
+        # Sort by performance score, skipping moves without games
+        order = np.argsort(-performance, kind="stable")
+        order = order[total[order] > 0].tolist()
+        
+        wins, losses, draws, total = wins.tolist(), losses.tolist(), draws.tolist(), total.tolist()
+        performance, evaluation, confidence = performance.tolist(), evaluation.tolist(), confidence.tolist()
+        network = dataset_name or "dataset"
+        
+        return [
+            DatasetMove(
+                move=move_col[i],
+                wins=wins[i],
+                losses=losses[i],
+                draws=draws[i],
+                total_games=total[i],
+                performance_score=performance[i],
+                evaluation_score=evaluation[i],
+                confidence_level=confidence[i],
+                network=network,
+                source_files=datasets_col[i].split(',')
+            )
+            for i in order
+        ]
+    
+    def get_position_summary(self, fen: str, dataset_name: str = None) -> Optional[Dict]:
+        """Get the best move and total game count for a position, or None without data"""
+        pos_key = _fen_position_key(fen)
+        
+        with self._conn_lock:
+            if dataset_name:
+                row = self._conn.execute(_SQL_POSITION_SUMMARY_DATASET,
+                                         (pos_key, dataset_name)).fetchone()
+            else:
+                row = self._conn.execute(_SQL_POSITION_SUMMARY, (pos_key,)).fetchone()
         
-        normalized_fen = normalize_fen(fen)
+        if row is None:
+            return None
+        
+        move, wins, losses, draws, total_games = row
+        move_games = wins + losses + draws
+        performance = (wins + 0.5 * draws) / move_games
         
-        if dataset_name:
-            cursor.execute("""
-                SELECT move, wins, losses, draws, dataset
-                FROM position_stats
-                WHERE fen = ? AND dataset = ?
-            """, (normalized_fen, dataset_name))
+        if move_games >= 100:
+            confidence = "high"
+        elif move_games >= 50:
+            confidence = "medium"
         else:
-            cursor.execute("""
-                SELECT move, wins, losses, draws, dataset
-                FROM position_stats
-                WHERE fen = ?
-            """, (normalized_fen,))
-        
-        # Aggregate statistics across datasets
-        move_stats = defaultdict(lambda: {"wins": 0, "losses": 0, "draws": 0, "datasets": set()})
-        
-        for row in cursor.fetchall():
-            move, wins, losses, draws, dataset = row
-            move_stats[move]["wins"] += wins
-            move_stats[move]["losses"] += losses
-            move_stats[move]["draws"] += draws
-            move_stats[move]["datasets"].add(dataset)
-        
-        # Convert to DatasetMove objects
-        moves = []
-        for move, stats in move_stats.items():
-            total_games = stats["wins"] + stats["losses"] + stats["draws"]
-            if total_games == 0:
-                continue
-            
-            performance = (stats["wins"] + 0.5 * stats["draws"]) / total_games
-            evaluation_score = int((performance - 0.5) * 200)  # Convert to centipawns
-            
-            # Determine confidence level
-            if total_games >= 100:
-                confidence = "high"
-            elif total_games >= 50:
-                confidence = "medium"
-            else:
-                confidence = "low"
-            
-            moves.append(DatasetMove(
-                move=move,
-                wins=stats["wins"],
-                losses=stats["losses"],
-                draws=stats["draws"],
-                total_games=total_games,
-                performance_score=performance,
-                evaluation_score=evaluation_score,
-                confidence_level=confidence,
-                network=dataset_name or "dataset",
-                source_files=list(stats["datasets"])
-            ))
-        
-        conn.close()
-        
-        # Sort by performance score
-        moves.sort(key=lambda m: m.performance_score, reverse=True)
-        return moves
+            confidence = "low"
+        
+        return {
+            "total_games": total_games,
+            "best_move": move,
+            "evaluation": int((performance - 0.5) * 200),
+            "confidence": confidence,
+            "performance": performance
+        }
 
 class DatasetAnalyzer:
     """Main dataset-based analyzer that replaces Stockfish"""
@@ -408,8 +806,9 @@ class DatasetAnalyzer:
     def __init__(self):
         self.downloader = DatasetDownloader()
         self.processor = DatasetProcessor()
-        self.cache = {}
-        self.lock = threading.Lock()
+        # Bounded LRU of analyzed positions keyed by (normalized_fen, dataset_name)
+        self._cache = TTLCache(maxsize=4096, ttl=float('inf'))
+        self._sample_moves: Dict[str, Tuple[DatasetMove, ...]] = {}
         
         # Initialize with sample data if no datasets available
         self._ensure_sample_data()
@@ -431,36 +830,37 @@ class DatasetAnalyzer:
         
         for fen in sample_positions:
             board = chess.Board(fen)
-            legal_moves = [move.uci() for move in board.legal_moves]
+            legal_moves = [move.uci() for move in board.legal_moves][:8]
+            n = len(legal_moves)
             
-            for i, move in enumerate(legal_moves[:8]):
-                # Generate realistic statistics
-                total_games = random.randint(100, 1000)
-                wins = random.randint(20, total_games - 40)
-                losses = random.randint(20, total_games - wins - 20)
-                draws = total_games - wins - losses
-                
-                performance = (wins + 0.5 * draws) / total_games
-                evaluation_score = int((performance - 0.5) * 200)
-                
-                dataset_move = DatasetMove(
+            # Generate realistic statistics for all moves at once
+            total_games = _rng.integers(100, 1001, n)
+            wins = _rng.integers(20, total_games - 39)
+            losses = _rng.integers(20, total_games - wins - 19)
+            draws = total_games - wins - losses
+            
+            performance = (wins + 0.5 * draws) / total_games
+            evaluation_score = ((performance - 0.5) * 200).astype(np.int64)
+            
+            sample_moves = [
+                DatasetMove(
                     move=move,
-                    wins=wins,
-                    losses=losses,
-                    draws=draws,
-                    total_games=total_games,
-                    performance_score=performance,
-                    evaluation_score=evaluation_score,
-                    confidence_level="high" if total_games >= 100 else "medium",
+                    wins=w,
+                    losses=l,
+                    draws=d,
+                    total_games=t,
+                    performance_score=perf,
+                    evaluation_score=ev,
+                    confidence_level="high" if t >= 100 else "medium",
                     network="sample",
                     source_files=["sample_data.pgn"]
                 )
-                
-                # Cache the result
-                key = f"{normalize_fen(fen)}:sample"
-                if key not in self.cache:
-                    self.cache[key] = []
-                self.cache[key].append(dataset_move)
+                for move, w, l, d, t, perf, ev in zip(
+                    legal_moves, wins.tolist(), losses.tolist(), draws.tolist(),
+                    total_games.tolist(), performance.tolist(), evaluation_score.tolist())
+            ]
+            
+            self._sample_moves[normalize_fen(fen)] = tuple(sample_moves)
         
         logger.info("Generated sample data for common chess positions")
     
@@ -479,30 +879,34 @@ class DatasetAnalyzer:
             logger.error(f"Failed to download and process dataset {dataset_name}: {e}")
             return False
     
-    def analyze_position(self, fen: str, dataset_name: str = None) -> List[DatasetMove]:
+    def analyze_position(self, fen: str, dataset_name: str = None) -> Tuple[DatasetMove, ...]:
         """Analyze a position using dataset statistics"""
-        normalized_fen = normalize_fen(fen)
-        cache_key = f"{normalized_fen}:{dataset_name or 'all'}"
+        return self._analyze(normalize_fen(fen), dataset_name)
+    
+    def analyze_board(self, board: chess.Board, dataset_name: str = None) -> Tuple[DatasetMove, ...]:
+        """Analyze a position the caller already holds as a board"""
+        return self._analyze(fast_epd(board) + ' 0 1', dataset_name, board)
+    
+    def _analyze(self, normalized_fen: str, dataset_name: Optional[str],
+                 board: Optional[chess.Board] = None) -> Tuple[DatasetMove, ...]:
+        """Cached analysis of a normalized position"""
+        cache_key = (normalized_fen, dataset_name)
         
         # Check cache first
-        with self.lock:
-            if cache_key in self.cache:
-                return self.cache[cache_key]
-        
-        # Get statistics from database
-        moves = self.processor.get_position_stats(normalized_fen, dataset_name)
+        moves = self._cache.get(cache_key)
+        if moves is not None:
+            return moves
         
-        # If no database results, check sample data
+        # Get statistics from database, falling back to sample data
+        if board is not None:
+            moves = tuple(self.processor.get_board_stats(board, dataset_name))
+        else:
+            moves = tuple(self.processor.get_position_stats(normalized_fen, dataset_name))
         if not moves:
-            sample_key = f"{normalized_fen}:sample"
-            with self.lock:
-                if sample_key in self.cache:
-                    return self.cache[sample_key]
-        
-        # Cache the result
-        with self.lock:
-            self.cache[cache_key] = moves
+            moves = self._sample_moves.get(normalized_fen, ())
         
+        # Cache an immutable result so callers cannot alter the shared value
+        self._cache.set(cache_key, moves)
         return moves
     
     def get_available_datasets(self) -> List[str]:
@@ -515,7 +919,15 @@ class DatasetAnalyzer:
     
     def get_analysis_summary(self, fen: str, dataset_name: str = None) -> Dict:
         """Get a summary of analysis for a position"""
-        moves = self.analyze_position(fen, dataset_name)
+        normalized_fen = normalize_fen(fen)
+        moves = self._cache.get((normalized_fen, dataset_name))
+        
+        # Without a cached analysis, let SQLite pick the best move and total
+        if moves is None:
+            summary = self.processor.get_position_summary(normalized_fen, dataset_name)
+            if summary is not None:
+                return summary
+            moves = self.analyze_position(normalized_fen, dataset_name)
         
         if not moves:
             return {
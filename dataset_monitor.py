@@ -3,19 +3,23 @@
 Dataset monitoring script for continuous dataset access health monitoring
 """
 import sys
-import time
+import signal
 import threading
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 from utils import get_logger
 from data_manager import DataManager, DatasetManager
 
 logger = get_logger(__name__)
 
+# Upper bound on concurrent dataset health checks
+_MAX_CHECK_WORKERS = 16
+
 @dataclass
 class DatasetHealth:
     """Dataset health information"""
@@ -29,6 +33,27 @@ class DatasetHealth:
     file_size_mb: float = 0.0
     checksum: Optional[str] = None
     error_message: Optional[str] = None
+    # Guards this record's fields, so updates to different datasets don't contend
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    # isoformat() strings kept alongside the datetimes, formatted once per update
+    last_check_iso: str = field(default="", repr=False, compare=False)
+    last_access_iso: Optional[str] = field(default=None, repr=False, compare=False)
+    
+    def __post_init__(self):
+        if not self.last_check_iso:
+            self.last_check_iso = self.last_check.isoformat()
+        if self.last_access is not None and self.last_access_iso is None:
+            self.last_access_iso = self.last_access.isoformat()
+    
+    def mark_checked(self, now: datetime):
+        """Set last_check and its formatted string"""
+        self.last_check = now
+        self.last_check_iso = now.isoformat()
+    
+    def mark_accessed(self, now: datetime):
+        """Set last_access and its formatted string"""
+        self.last_access_iso = now.isoformat()
+        self.last_access = now
 
 class DatasetMonitor:
     """Continuous dataset health monitoring"""
@@ -38,7 +63,9 @@ class DatasetMonitor:
         self.dataset_manager = self.data_manager.dataset_manager
         self.check_interval = check_interval
         self.monitoring = False
+        self._stop_event = threading.Event()
         self.health_data = {}
+        # Guards the structure of health_data; each record has its own lock
         self.lock = threading.Lock()
         self.monitor_thread = None
         
@@ -57,6 +84,7 @@ class DatasetMonitor:
             return
         
         self.monitoring = True
+        self._stop_event.clear()
         self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.monitor_thread.start()
         logger.info(f"Started dataset monitoring (check interval: {self.check_interval}s)")
@@ -64,85 +92,134 @@ class DatasetMonitor:
     def stop_monitoring(self):
         """Stop continuous monitoring"""
         self.monitoring = False
+        self._stop_event.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
         logger.info("Stopped dataset monitoring")
     
     def _monitor_loop(self):
         """Main monitoring loop"""
-        while self.monitoring:
+        while not self._stop_event.is_set():
+            delay = self.check_interval
             try:
                 self._check_all_datasets()
-                time.sleep(self.check_interval)
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
-                time.sleep(60)  # Wait 1 minute before retrying
+                delay = 60  # Wait 1 minute before retrying
+            
+            # Returns as soon as stop_monitoring() is called
+            if self._stop_event.wait(delay):
+                break
+    
+    def request_stop(self):
+        """Ask the monitor loop to stop without waiting for it; safe in signal handlers"""
+        self.monitoring = False
+        self._stop_event.set()
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until monitoring is stopped or the timeout expires"""
+        return self._stop_event.wait(timeout)
     
     def _check_all_datasets(self):
         """Check health of all datasets"""
         logger.debug("Checking dataset health...")
         
-        for dataset_name in self.dataset_manager.dataset_sources:
-            try:
-                self._check_dataset_health(dataset_name)
-            except Exception as e:
-                logger.error(f"Error checking health of {dataset_name}: {e}")
-                self._update_health(dataset_name, "error", error_message=str(e))
+        # One timestamp for the whole cycle
+        now = datetime.now()
+        
+        # One directory scan covers every dataset; files that changed still need verifying
+        statuses = self.dataset_manager.get_all_statuses(verify=False)
+        dataset_names = []
+        for dataset_name, (status_info, is_available) in statuses.items():
+            if is_available is None:
+                dataset_names.append(dataset_name)
+            else:
+                self._apply_status(dataset_name, now, status_info, is_available)
+        
+        if not dataset_names:
+            return
+        
+        # Datasets are independent, so a cycle costs the slowest check rather than the sum
+        executor = ThreadPoolExecutor(max_workers=min(_MAX_CHECK_WORKERS, len(dataset_names)),
+                                      thread_name_prefix="dataset-check")
+        futures = {executor.submit(self._check_dataset_health, name, now): name
+                   for name in dataset_names}
+        try:
+            for future in as_completed(futures, timeout=self.check_interval * 0.9):
+                dataset_name = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error checking health of {dataset_name}: {e}")
+                    self._update_health(dataset_name, "error", now, error_message=str(e))
+        except FuturesTimeoutError:
+            for future, dataset_name in futures.items():
+                if not future.done():
+                    logger.error(f"Health check of {dataset_name} timed out")
+                    self._update_health(dataset_name, "error", now, error_message="Health check timed out")
+        finally:
+            # Don't let a hung check hold up the next cycle
+            executor.shutdown(wait=False, cancel_futures=True)
     
-    def _check_dataset_health(self, dataset_name: str):
+    def _check_dataset_health(self, dataset_name: str, now: Optional[datetime] = None):
         """Check health of a specific dataset"""
-        with self.lock:
-            health = self.health_data[dataset_name]
-            health.last_check = datetime.now()
+        now = now or datetime.now()
+        health = self.health_data[dataset_name]
+        with health.lock:
+            health.mark_checked(now)
         
         try:
-            # Get dataset status
-            status_info = self.dataset_manager.get_dataset_status(dataset_name)
-            
-            # Check if dataset is available and verified
+            # Verification result is cached by the dataset manager for the status call
             is_available = self.dataset_manager.is_dataset_available(dataset_name)
-            
-            if is_available:
-                # Dataset is healthy
-                self._update_health(dataset_name, "healthy", 
-                                  file_size_mb=status_info.get("file_size_mb", 0),
-                                  checksum=status_info.get("checksum"))
-                logger.debug(f"Dataset {dataset_name} is healthy")
-            else:
-                # Dataset is not available
-                if status_info.get("downloaded", False):
-                    # Downloaded but not verified (corrupted)
-                    self._update_health(dataset_name, "warning", 
-                                      error_message="Dataset downloaded but failed verification")
-                    logger.warning(f"Dataset {dataset_name} is corrupted")
-                else:
-                    # Not downloaded
-                    self._update_health(dataset_name, "error", 
-                                      error_message="Dataset not downloaded")
-                    logger.debug(f"Dataset {dataset_name} is not downloaded")
-                    
+            status_info = self.dataset_manager.get_dataset_status(dataset_name)
+            self._apply_status(dataset_name, now, status_info, is_available)
         except Exception as e:
-            self._update_health(dataset_name, "error", error_message=str(e))
+            self._update_health(dataset_name, "error", now, error_message=str(e))
             logger.error(f"Error checking health of {dataset_name}: {e}")
     
-    def _update_health(self, dataset_name: str, status: str, **kwargs):
+    def _apply_status(self, dataset_name: str, now: datetime, status_info: Dict, is_available: bool):
+        """Translate a dataset status into its health record"""
+        if is_available:
+            # Dataset is healthy
+            self._update_health(dataset_name, "healthy", now,
+                              file_size_mb=status_info.get("file_size_mb", 0),
+                              checksum=status_info.get("checksum"))
+            logger.debug(f"Dataset {dataset_name} is healthy")
+        else:
+            # Dataset is not available
+            if status_info.get("downloaded", False):
+                # Downloaded but not verified (corrupted)
+                self._update_health(dataset_name, "warning", now,
+                                  error_message="Dataset downloaded but failed verification")
+                logger.warning(f"Dataset {dataset_name} is corrupted")
+            else:
+                # Not downloaded
+                self._update_health(dataset_name, "error", now,
+                                  error_message="Dataset not downloaded")
+                logger.debug(f"Dataset {dataset_name} is not downloaded")
+    
+    def _update_health(self, dataset_name: str, status: str, now: Optional[datetime] = None, **kwargs):
         """Update health data for a dataset"""
-        with self.lock:
-            if dataset_name in self.health_data:
-                health = self.health_data[dataset_name]
-                health.status = status
-                health.last_check = datetime.now()
-                
-                for key, value in kwargs.items():
-                    if hasattr(health, key):
-                        setattr(health, key, value)
+        health = self.health_data.get(dataset_name)
+        if health is None:
+            return
+        
+        with health.lock:
+            health.status = status
+            health.mark_checked(now or datetime.now())
+            
+            for key, value in kwargs.items():
+                if hasattr(health, key):
+                    setattr(health, key, value)
     
     def record_access(self, dataset_name: str, success: bool = True):
         """Record dataset access attempt"""
-        with self.lock:
-            if dataset_name in self.health_data:
-                health = self.health_data[dataset_name]
-                health.last_access = datetime.now()
+        # The per-record lock keeps increments from being lost without blocking other datasets
+        health = self.health_data.get(dataset_name)
+        if health is not None:
+            now = datetime.now()
+            with health.lock:
+                health.mark_accessed(now)
                 health.access_count += 1
                 
                 if not success:
@@ -150,62 +227,69 @@ class DatasetMonitor:
     
     def record_download_attempt(self, dataset_name: str):
         """Record download attempt"""
-        with self.lock:
-            if dataset_name in self.health_data:
-                health = self.health_data[dataset_name]
+        health = self.health_data.get(dataset_name)
+        if health is not None:
+            with health.lock:
                 health.download_attempts += 1
     
+    def _snapshot(self) -> List[Tuple[str, DatasetHealth]]:
+        """Copy the health records so callers can read them without holding any lock"""
+        with self.lock:
+            items = list(self.health_data.items())
+        
+        snapshot = []
+        for name, health in items:
+            with health.lock:
+                snapshot.append((name, replace(health)))
+        return snapshot
+    
     def get_health_summary(self) -> Dict:
         """Get summary of dataset health"""
-        with self.lock:
-            summary = {
-                "total_datasets": len(self.health_data),
-                "healthy": 0,
-                "warning": 0,
-                "error": 0,
-                "unknown": 0,
-                "datasets": {}
+        snapshot = self._snapshot()
+        
+        summary = {
+            "total_datasets": len(snapshot),
+            "healthy": 0,
+            "warning": 0,
+            "error": 0,
+            "unknown": 0,
+            "datasets": {}
+        }
+        
+        for name, health in snapshot:
+            summary["datasets"][name] = {
+                "status": health.status,
+                "last_check": health.last_check_iso,
+                "last_access": health.last_access_iso,
+                "access_count": health.access_count,
+                "error_count": health.error_count,
+                "download_attempts": health.download_attempts,
+                "file_size_mb": health.file_size_mb,
+                "checksum": health.checksum,
+                "error_message": health.error_message
             }
             
-            for name, health in self.health_data.items():
-                summary["datasets"][name] = {
-                    "status": health.status,
-                    "last_check": health.last_check.isoformat(),
-                    "last_access": health.last_access.isoformat() if health.last_access else None,
-                    "access_count": health.access_count,
-                    "error_count": health.error_count,
-                    "download_attempts": health.download_attempts,
-                    "file_size_mb": health.file_size_mb,
-                    "checksum": health.checksum,
-                    "error_message": health.error_message
-                }
-                
-                summary[health.status] += 1
-            
-            return summary
+            summary[health.status] += 1
+        
+        return summary
     
     def get_unhealthy_datasets(self) -> List[str]:
         """Get list of unhealthy datasets"""
-        with self.lock:
-            unhealthy = []
-            for name, health in self.health_data.items():
-                if health.status in ["warning", "error"]:
-                    unhealthy.append(name)
-            return unhealthy
+        return [name for name, health in self._snapshot()
+                if health.status in ["warning", "error"]]
     
     def get_dataset_recommendations(self) -> List[str]:
         """Get recommendations for dataset issues"""
         recommendations = []
         
-        with self.lock:
-            for name, health in self.health_data.items():
-                if health.status == "error":
-                    if health.error_count > 5:
-                        recommendations.append(f"Dataset {name} has {health.error_count} errors - consider re-downloading")
-                    elif not health.last_access:
-                        recommendations.append(f"Dataset {name} has never been accessed - consider downloading if needed")
-                elif health.status == "warning":
-                    recommendations.append(f"Dataset {name} is corrupted - consider re-downloading")
+        for name, health in self._snapshot():
+            if health.status == "error":
+                if health.error_count > 5:
+                    recommendations.append(f"Dataset {name} has {health.error_count} errors - consider re-downloading")
+                elif not health.last_access:
+                    recommendations.append(f"Dataset {name} has never been accessed - consider downloading if needed")
+            elif health.status == "warning":
+                recommendations.append(f"Dataset {name} is corrupted - consider re-downloading")
         
         return recommendations
 
@@ -260,14 +344,22 @@ def main():
         logger.info("Starting dataset monitoring...")
         monitor.start_monitoring()
         
+        # Ctrl+C just wakes the wait below; the handler avoids logging or joining threads
+        interrupted = threading.Event()
+        def on_interrupt(signum, frame):
+            interrupted.set()
+            monitor.request_stop()
+        signal.signal(signal.SIGINT, on_interrupt)
+        
         try:
             if args.duration > 0:
                 logger.info(f"Monitoring for {args.duration} seconds...")
-                time.sleep(args.duration)
             else:
                 logger.info("Monitoring indefinitely (press Ctrl+C to stop)...")
-                while True:
-                    time.sleep(1)
+            monitor.wait(args.duration or None)
+            
+            if interrupted.is_set():
+                logger.info("Received interrupt signal, stopping...")
                     
         except KeyboardInterrupt:
             logger.info("Received interrupt signal, stopping...")
@@ -7,56 +7,44 @@ import logging
 from pathlib import Path
 
 from config import config
-from data_manager import DataManager
-from engine_analyzer import engine_manager
 from utils import normalize_fen, get_legal_moves, get_logger, fetch_lichess_api
 
 logger = get_logger()
 
+def emit(text: str):
+    """Log a demo message and echo it to the console"""
+    logger.info(text)
+    print(text)
+
 def demo_basic_functionality():
     """Demonstrate basic functionality"""
-    demo_text = "=== Chess Opening Explorer Demo ===\n"
-    logger.info(demo_text)
-    print(demo_text)
+    # Heavy modules are imported only once a demo actually runs
+    from data_manager import DataManager
+    from engine_analyzer import engine_manager
+    
+    emit("=== Chess Opening Explorer Demo ===\n")
     
     # Initialize data manager
-    init_text = "1. Initializing data manager..."
-    logger.info(init_text)
-    print(init_text)
+    emit("1. Initializing data manager...")
     data_manager = DataManager()
-    success_text = "   ✓ Data manager initialized\n"
-    logger.info(success_text)
-    print(success_text)
+    emit("   ✓ Data manager initialized\n")
     
     # Test with starting position
-    test_text = "2. Testing with starting position..."
-    logger.info(test_text)
-    print(test_text)
+    emit("2. Testing with starting position...")
     fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
     normalized_fen = normalize_fen(fen)
-    fen_info = f"   Original FEN: {fen}"
-    logger.info(fen_info)
-    print(fen_info)
-    norm_info = f"   Normalized FEN: {normalized_fen}"
-    logger.info(norm_info)
-    print(norm_info)
+    emit(f"   Original FEN: {fen}")
+    emit(f"   Normalized FEN: {normalized_fen}")
     
     # Get legal moves
     legal_moves = get_legal_moves(fen)
-    moves_info = f"   Legal moves: {len(legal_moves)}"
-    logger.info(moves_info)
-    print(moves_info)
-    first_moves = f"   First 5 moves: {legal_moves[:5]}"
-    logger.info(first_moves)
-    print(first_moves)
+    emit(f"   Legal moves: {len(legal_moves)}")
+    emit(f"   First 5 moves: {legal_moves[:5]}")
     
     # Get statistics (will be empty initially)
     stats = data_manager.get_position_stats(fen)
-    stats_info = f"   Statistics found: {len(stats)} moves with data"
-    logger.info(stats_info)
-    print(stats_info)
-    logger.info("")
-    print()
+    emit(f"   Statistics found: {len(stats)} moves with data")
+    emit("")
     
     # Test engine availability
     print("3. Checking engine availability...")
@@ -122,6 +110,8 @@ def demo_basic_functionality():
 
 def demo_advanced_features():
     """Demonstrate advanced features"""
+    from data_manager import DataManager
+    
     print("\n=== Advanced Features Demo ===\n")
     
     # Test different positions
@@ -2,15 +2,16 @@
 """
 Demo script showing the dataset analyzer functionality
 """
-import chess
 import time
-from dataset_analyzer import dataset_analyzer
 from utils import get_logger
 
 logger = get_logger()
 
 def demo_dataset_analyzer():
     """Demo the dataset analyzer functionality"""
+    # Importing dataset_analyzer builds the global analyzer, so defer it to here
+    import chess
+    from dataset_analyzer import dataset_analyzer
     
     print("Chess Dataset Analyzer Demo")
     print("=" * 50)
@@ -25,8 +26,8 @@ def demo_dataset_analyzer():
     print(f"Position: After 1. e4")
     print()
     
-    # Get analysis from dataset
-    moves = dataset_analyzer.analyze_position(fen)
+    # Get analysis from dataset, reusing the board instead of parsing the FEN again
+    moves = dataset_analyzer.analyze_board(board)
     
     if moves:
         print(f"Found {len(moves)} moves from dataset analysis:")
@@ -34,8 +35,11 @@ def demo_dataset_analyzer():
         print(f"{'Move':<8} {'Wins':<6} {'Losses':<8} {'Draws':<6} {'Total':<6} {'Perf':<6} {'Eval':<6}")
         print("-" * 60)
         
+        # Parse each UCI move once for both the table and the best-move line
+        parsed = {move.move: chess.Move.from_uci(move.move) for move in moves[:10]}
+        
         for i, move in enumerate(moves[:10], 1):  # Show top 10 moves
-            san = board.san(chess.Move.from_uci(move.move))
+            san = board.san(parsed[move.move])
             print(f"{san:<8} {move.wins:<6} {move.losses:<8} {move.draws:<6} "
                   f"{move.total_games:<6} {move.performance_score:.3f} {move.evaluation_score:+4d}")
         
@@ -44,7 +48,7 @@ def demo_dataset_analyzer():
         
         # Show best move
         best_move = moves[0]
-        best_san = board.san(chess.Move.from_uci(best_move.move))
+        best_san = board.san(parsed[best_move.move])
         print(f"Best move: {best_san}")
         print(f"Performance: {best_move.performance_score:.3f}")
         print(f"Evaluation: {best_move.evaluation_score:+d} centipawns")
@@ -4,6 +4,11 @@ Test script for the Chess Opening Explorer system
 """
 import sys
 import logging
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 from utils import get_logger
@@ -79,10 +84,35 @@ def test_utils():
         normalized = normalize_fen(fen)
         logger.info(f"✓ FEN normalization: {normalized}")
         
+        # Clocks are reset and en passant squares without a legal capture dropped
+        assert normalize_fen("8/8/8/8/8/8/8/K6k w - - 12 40") == "8/8/8/8/8/8/8/K6k w - - 0 1"
+        assert normalize_fen("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1").endswith(" - 0 1")
+        
+        # Castling rights the position cannot have are cleaned up
+        assert normalize_fen("8/8/8/8/8/8/8/K6k w KQkq - 3 20") == "8/8/8/8/8/8/8/K6k w - - 0 1"
+        assert normalize_fen("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1") == "r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1"
+        
+        # Malformed FENs are rejected rather than passed through
+        for bad_fen in ("foo w - - 0 1", "8/8/8/8/8/8/8/K6k x - - 0 1"):
+            try:
+                normalize_fen(bad_fen)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"normalize_fen accepted {bad_fen!r}")
+        
         # Test legal moves
         moves = get_legal_moves(fen)
         logger.info(f"✓ Legal moves found: {len(moves)}")
         
+        # Test bitboard EPD builder against python-chess
+        import chess
+        from utils import fast_epd
+        for epd_fen in (fen, "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3"):
+            board = chess.Board(epd_fen)
+            assert fast_epd(board) == board.epd()
+        logger.info(f"✓ Fast EPD matches board.epd(): {fast_epd(board)}")
+        
         # Test FEN validation
         is_valid = is_valid_fen(fen)
         logger.info(f"✓ FEN validation: {is_valid}")
@@ -91,6 +121,16 @@ def test_utils():
         stats = MoveStats(fen=fen, move="e2e4", wins=10, losses=5, draws=3)
         logger.info(f"✓ MoveStats created: performance={stats.performance_score:.3f}")
         
+        # Test TTL cache
+        from utils import TTLCache
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None and cache.get("a") == 1
+        logger.info(f"✓ TTL cache evicts least recently used: {len(cache)} entries")
+        
         return True
     except Exception as e:
         logger.error(f"✗ Utilities test failed: {e}")
@@ -171,6 +211,292 @@ def test_api_server():
         logger.error(f"✗ API server test failed: {e}")
         return False
 
+def test_storage_migrations():
+    """Test the SQLite schema migrations on temporary databases"""
+    logger.info("Testing storage migrations...")
+    
+    try:
+        import chess
+        import data_manager
+        import dataset_analyzer
+        from data_manager import CacheManager
+        from dataset_analyzer import DatasetProcessor
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            # CacheManager: a pre-versioning move_stats table gains both migrations
+            conn = sqlite3.connect(str(Path(tmp) / "move_stats.db"))
+            conn.executescript("""
+                CREATE TABLE move_stats (
+                    fen TEXT NOT NULL, move TEXT NOT NULL,
+                    wins INTEGER DEFAULT 0, losses INTEGER DEFAULT 0, draws INTEGER DEFAULT 0,
+                    network TEXT, source_files TEXT, last_updated REAL,
+                    PRIMARY KEY (fen, move, network)
+                );
+                CREATE INDEX idx_move_stats_fen_network ON move_stats(fen, network);
+                INSERT INTO move_stats VALUES ('start', 'e2e4', 3, 1, 2, 'lichess', '[]', 0);
+            """)
+            conn.commit()
+            
+            cache = CacheManager.__new__(CacheManager)
+            cache._local = threading.local()
+            cache._local.conn = conn
+            cache._sqlite_ready = True
+            cache.migrate()
+            cache.migrate()  # Already current, so this is a no-op
+            
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == data_manager._SCHEMA_VERSION
+            row = conn.execute("SELECT evaluation_score, win_rate_x1000 FROM move_stats").fetchone()
+            assert tuple(row) == (0, 666)
+            indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            assert "idx_move_stats_rate" in indexes and "idx_move_stats_fen_network" not in indexes
+            conn.close()
+            logger.info("✓ CacheManager migrations add evaluation_score, win_rate_x1000 and indexes")
+            
+            # DatasetProcessor v1: FEN rows are re-keyed, and clocks no longer split a position
+            conn = sqlite3.connect(str(Path(tmp) / "dataset_v0.db"), isolation_level=None)
+            conn.executescript("""
+                CREATE TABLE position_stats (
+                    fen TEXT, move TEXT,
+                    wins INTEGER DEFAULT 0, losses INTEGER DEFAULT 0, draws INTEGER DEFAULT 0,
+                    dataset TEXT, last_updated REAL,
+                    PRIMARY KEY (fen, move, dataset)
+                );
+            """)
+            start = chess.STARTING_FEN
+            conn.executemany("INSERT INTO position_stats VALUES (?, 'e2e4', ?, ?, ?, 'ds', 0)", [
+                (start, 1, 0, 0),
+                (start.replace(" 0 1", " 4 9"), 2, 1, 1),
+            ])
+            
+            processor = DatasetProcessor.__new__(DatasetProcessor)
+            processor._conn = conn
+            processor._migrate()
+            
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == dataset_analyzer._SCHEMA_VERSION
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(position_stats)")]
+            assert "pos_key" in columns and "fen" not in columns
+            rows = conn.execute("SELECT pos_key, move, wins, losses, draws FROM position_stats").fetchall()
+            assert rows == [(dataset_analyzer._position_key(chess.Board()), "e2e4", 3, 1, 1)]
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'position_stats'").fetchone()[0]
+            assert "WITHOUT ROWID" in sql.upper()
+            conn.close()
+            logger.info("✓ Dataset migration v1 merges FEN rows under one pos_key")
+            
+            # DatasetProcessor v2: a rowid pos_key table is rebuilt WITHOUT ROWID, rows intact
+            conn = sqlite3.connect(str(Path(tmp) / "dataset_v1.db"), isolation_level=None)
+            conn.executescript("""
+                CREATE TABLE position_stats (
+                    pos_key INTEGER, move TEXT,
+                    wins INTEGER DEFAULT 0, losses INTEGER DEFAULT 0, draws INTEGER DEFAULT 0,
+                    dataset TEXT, last_updated REAL,
+                    PRIMARY KEY (pos_key, move, dataset)
+                );
+                INSERT INTO position_stats VALUES (42, 'd2d4', 5, 4, 3, 'ds', 1.5);
+                PRAGMA user_version = 1;
+            """)
+            
+            processor._conn = conn
+            processor._migrate()
+            
+            sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'position_stats'").fetchone()[0]
+            assert "WITHOUT ROWID" in sql.upper()
+            assert conn.execute("SELECT * FROM position_stats").fetchall() == [(42, 'd2d4', 5, 4, 3, 'ds', 1.5)]
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == dataset_analyzer._SCHEMA_VERSION
+            conn.close()
+            logger.info("✓ Dataset migration v2 rebuilds position_stats WITHOUT ROWID")
+        
+        return True
+    except Exception as e:
+        logger.error(f"✗ Storage migrations test failed: {e}")
+        return False
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Serves one payload, answering Range requests unless honor_ranges is off"""
+    payload = b""
+    honor_ranges = True
+    head_length = True
+    ranges_seen = []
+    
+    def do_HEAD(self):
+        self._respond(send_body=False)
+    
+    def do_GET(self):
+        self._respond(send_body=True)
+    
+    def _respond(self, send_body: bool):
+        body = self.payload
+        byte_range = self.headers.get("Range")
+        if byte_range and self.honor_ranges:
+            start, _, end = byte_range[len("bytes="):].partition("-")
+            start, end = int(start), int(end) if end else len(body) - 1
+            self.ranges_seen.append((start, end))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            body = body[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        if send_body or self.head_length:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+@contextmanager
+def _serve(payload: bytes, honor_ranges: bool = True, head_length: bool = True):
+    """Serve a payload on a local port; yields its URL and the handler class"""
+    handler = type("Handler", (_RangeHandler,),
+                   {"payload": payload, "honor_ranges": honor_ranges,
+                    "head_length": head_length, "ranges_seen": []})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/games.pgn.zst", handler
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_downloads():
+    """Test range and resumed downloads against a local HTTP server"""
+    logger.info("Testing downloads...")
+    
+    try:
+        import zstandard as zstd
+        import dataset_analyzer
+        from dataset_analyzer import DatasetDownloader
+        from data_manager import ArchiveDownloader
+        
+        pgn = b"".join(b'[Event "Game %d"]\n[Result "1-0"]\n\n1. e4 e5 2. Nf3 1-0\n\n' % i
+                       for i in range(2000))
+        payload = zstd.ZstdCompressor().compress(pgn)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            downloader = DatasetDownloader()
+            downloader.dataset_dir = Path(tmp)
+            target = Path(tmp) / "tiny.pgn.zst"
+            part = Path(tmp) / "tiny.pgn.zst.part"
+            
+            # Parallel ranges: every range arrives and the archive is installed whole
+            min_size = dataset_analyzer._PARALLEL_DOWNLOAD_MIN_SIZE
+            dataset_analyzer._PARALLEL_DOWNLOAD_MIN_SIZE = 0
+            try:
+                with _serve(payload) as (url, handler):
+                    downloader.dataset_sources = {"tiny": {"url": url, "size_mb": 0}}
+                    assert downloader.download_dataset("tiny")
+                    assert len(handler.ranges_seen) == dataset_analyzer._DOWNLOAD_CONNECTIONS
+            finally:
+                dataset_analyzer._PARALLEL_DOWNLOAD_MIN_SIZE = min_size
+            assert target.read_bytes() == payload
+            assert not part.exists() and not target.with_name("tiny.pgn.zst.ranges").exists()
+            logger.info("✓ Dataset range download installs a complete archive")
+            
+            # Resume: a stream-written .part is continued from its current size
+            target.unlink()
+            half = len(payload) // 2
+            part.write_bytes(payload[:half])
+            with _serve(payload) as (url, handler):
+                downloader.dataset_sources = {"tiny": {"url": url, "size_mb": 0}}
+                assert downloader.download_dataset("tiny")
+                assert handler.ranges_seen == [(half, len(payload) - 1)]
+            assert target.read_bytes() == payload and not part.exists()
+            logger.info("✓ Dataset download resumes a partial file")
+            
+            # A .part that does not decode is dropped instead of being installed
+            target.unlink()
+            part.write_bytes(b"\0" * half)
+            with _serve(payload) as (url, handler):
+                downloader.dataset_sources = {"tiny": {"url": url, "size_mb": 0}}
+                assert not downloader.download_dataset("tiny")
+            assert not target.exists() and not part.exists()
+            logger.info("✓ Corrupt partial download is rejected")
+            
+            # A complete .part left by a run killed before os.replace is only verified
+            part.write_bytes(payload)
+            with _serve(payload) as (url, handler):
+                downloader.dataset_sources = {"tiny": {"url": url, "size_mb": 0}}
+                assert downloader.download_dataset("tiny")
+                assert handler.ranges_seen == []
+            assert target.read_bytes() == payload and not part.exists()
+            
+            # Without a HEAD length the resume is rejected with 416 and restarted from scratch
+            target.unlink()
+            part.write_bytes(payload + b"stale")
+            with _serve(payload, head_length=False) as (url, handler):
+                downloader.dataset_sources = {"tiny": {"url": url, "size_mb": 0}}
+                assert downloader.download_dataset("tiny")
+                assert handler.ranges_seen == [(len(payload) + 5, len(payload) - 1)]
+            assert target.read_bytes() == payload and not part.exists()
+            logger.info("✓ Complete or oversized partial downloads do not get stuck")
+            
+            # Archives: ranges land in a .part that is only moved into place when complete
+            archives = ArchiveDownloader(None, None)
+            archives.archive_dir = Path(tmp)
+            with _serve(payload) as (url, handler):
+                assert archives.download_archive(url, "archive.pgn.zst")
+                assert len(handler.ranges_seen) == 4
+            assert (Path(tmp) / "archive.pgn.zst").read_bytes() == payload
+            
+            # A server that ignores Range fails the download without leaving a file behind
+            with _serve(payload, honor_ranges=False) as (url, handler):
+                assert not archives.download_archive(url, "ignored.pgn.zst")
+            assert not (Path(tmp) / "ignored.pgn.zst").exists()
+            assert not (Path(tmp) / "ignored.pgn.zst.part").exists()
+            logger.info("✓ Archive range download is all-or-nothing")
+        
+        return True
+    except Exception as e:
+        logger.error(f"✗ Downloads test failed: {e}")
+        return False
+
+def test_dataset_monitor():
+    """Test the dataset monitor's access counters"""
+    logger.info("Testing dataset monitor...")
+    
+    try:
+        from datetime import datetime
+        from dataset_monitor import DatasetMonitor, DatasetHealth
+        
+        # Skip __init__, which builds a DataManager; the counters only need these
+        monitor = DatasetMonitor.__new__(DatasetMonitor)
+        monitor.lock = threading.Lock()
+        monitor.health_data = {"ds": DatasetHealth(name="ds", status="unknown", last_check=datetime.now())}
+        
+        def record():
+            for i in range(1000):
+                monitor.record_access("ds", success=i % 4 != 0)
+                monitor.record_download_attempt("ds")
+                # Reads from other threads must not disturb the counts
+                monitor.health_data["ds"].access_count
+        
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        health = monitor.health_data["ds"]
+        assert (health.access_count, health.error_count, health.download_attempts) == (8000, 2000, 8000)
+        assert health.access_count == 8000  # Reading twice gives the same answer
+        
+        snapshot = dict(monitor._snapshot())["ds"]
+        assert (snapshot.access_count, snapshot.error_count) == (8000, 2000)
+        logger.info("✓ Access counters are exact under concurrent updates and reads")
+        
+        return True
+    except Exception as e:
+        logger.error(f"✗ Dataset monitor test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     logger.info("Starting Chess Opening Explorer system tests...")
@@ -183,6 +509,9 @@ def main():
         ("Engine Analyzer", test_engine_analyzer),
         ("GUI Components", test_gui_components),
         ("API Server", test_api_server),
+        ("Storage Migrations", test_storage_migrations),
+        ("Downloads", test_downloads),
+        ("Dataset Monitor", test_dataset_monitor),
     ]
     
     passed = 0
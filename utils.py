@@ -10,6 +10,8 @@ from dataclasses import dataclass
 from pathlib import Path
 import time
 import threading
+import functools
+from collections import OrderedDict
 from queue import Queue
 import gzip
 import bz2
@@ -119,16 +121,60 @@ class MoveStats:
         else:
             return "high"
 
+@functools.lru_cache(maxsize=65536)
 def normalize_fen(fen: str) -> str:
     """
     Normalize FEN by removing halfmove clock and move number
     to deduplicate transpositions
+    
+    Results are memoized since the same opening positions recur constantly.
     """
     board = chess.Board(fen)
     # Reconstruct FEN without move counters
     fen_parts = board.fen().split(' ')[:4]
     return ' '.join(fen_parts + ['0', '1'])
 
+# Piece symbols indexed by piece type - 1, white then black
+_PIECE_SYMBOLS = "PNBRQKpnbrqk"
+
+def fast_board_fen(board: chess.Board) -> str:
+    """
+    Build the piece placement part of a FEN straight from the bitboards,
+    without the Piece objects board.board_fen() creates per square
+    """
+    occupied = board.occupied
+    white = board.occupied_co[chess.WHITE]
+    piece_bbs = (board.pawns, board.knights, board.bishops,
+                 board.rooks, board.queens, board.kings)
+    
+    builder = []
+    for rank in range(7, -1, -1):
+        empty = 0
+        for square in range(rank * 8, rank * 8 + 8):
+            mask = chess.BB_SQUARES[square]
+            if not occupied & mask:
+                empty += 1
+                continue
+            if empty:
+                builder.append(str(empty))
+                empty = 0
+            for index, bb in enumerate(piece_bbs):
+                if bb & mask:
+                    builder.append(_PIECE_SYMBOLS[index if white & mask else index + 6])
+                    break
+        if empty:
+            builder.append(str(empty))
+        if rank:
+            builder.append("/")
+    return "".join(builder)
+
+def fast_epd(board: chess.Board) -> str:
+    """Equivalent of board.epd() built on fast_board_fen"""
+    ep_square = board.ep_square if board.has_legal_en_passant() else None
+    ep = chess.SQUARE_NAMES[ep_square] if ep_square is not None else "-"
+    turn = "w" if board.turn == chess.WHITE else "b"
+    return f"{fast_board_fen(board)} {turn} {board.castling_xfen()} {ep}"
+
 def get_legal_moves(fen: str) -> List[str]:
     """Get all legal moves from a position in UCI format"""
     board = chess.Board(fen)
@@ -190,6 +236,74 @@ class RateLimiter:
         while not self.acquire():
             time.sleep(0.1)
 
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed time-to-live"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.lock = threading.RLock()
+    
+    def get(self, key, default=None):
+        """Get a cached value, or default if missing or expired"""
+        with self.lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries when full"""
+        with self.lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        """Remove and return a cached value"""
+        with self.lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+    
+    def clear(self):
+        """Remove all entries"""
+        with self.lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._data)
+
+def ttl_cache(maxsize: int = 1024, ttl: float = 300.0):
+    """Memoize a function of positional arguments in a TTLCache.
+    
+    Like functools.lru_cache, the wrapper exposes cache_clear().
+    Exceptions are not cached.
+    """
+    def decorator(func):
+        cache = TTLCache(maxsize, ttl)
+        missing = object()
+        
+        @functools.wraps(func)
+        def wrapper(*args):
+            value = cache.get(args, missing)
+            if value is missing:
+                value = func(*args)
+                cache.set(args, value)
+            return value
+        
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
 class ProgressTracker:
     """Track progress of operations"""
     
@@ -271,11 +385,10 @@ def fetch_lichess_api(fen: str, endpoint: str = "lichess", multi_pv: int = 1) ->
     endpoint: 'lichess', 'masters', or 'cloud-eval'
     multi_pv: Only used for cloud-eval endpoint
     Returns parsed JSON data.
-    Aborts to command line on any error or warning.
+    Raises on any error or non-200 status; callers decide how to recover.
     Logs all requests, responses, and errors.
     """
     import requests
-    import sys
     logger = get_logger()
     base_urls = {
         "lichess": "https://explorer.lichess.ovh/lichess?variant=standard&fen={}",
@@ -292,12 +405,11 @@ def fetch_lichess_api(fen: str, endpoint: str = "lichess", multi_pv: int = 1) ->
         logger.info(f"Response status: {response.status_code}")
         if response.status_code != 200:
             logger.error(f"Lichess API error: {response.status_code} {response.text}")
-            print(f"Error: Lichess API returned status {response.status_code}")
-            sys.exit(1)
+            raise requests.HTTPError(f"Lichess API returned status {response.status_code}",
+                                     response=response)
         data = response.json()
         logger.info(f"Lichess API response: {json.dumps(data)[:1000]}")
         return data
     except Exception as e:
         logger.exception(f"Exception during Lichess API fetch: {e}")
-        print(f"Exception during Lichess API fetch: {e}")
-        sys.exit(1) 
\ No newline at end of file
+        raise
\ No newline at end of file